@@ -0,0 +1,245 @@
+#
+# Nattlig avvikelsedetektering på mätarnas timserier (kWh per timme).
+# Hittar fastnade mätare, dubblerade värden och plötsliga hopp i grundlasten med
+# rullande median/MAD och baslinjer för samma timme i veckan. Körs inkrementellt:
+# för varje mätare sparas de senaste veckornas värden så att nästa körning bara behöver den nya dagen.
+#
+import os
+import pickle
+import warnings
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, Iterable, Optional
+
+import calendar_index as ci
+import energy_cost as ec
+
+HOURS_PER_WEEK = 168
+HISTORY_HOURS = 4 * HOURS_PER_WEEK  # sparad historik per mätare
+ROLLING_HOURS = HOURS_PER_WEEK      # fönster för rullande median/MAD
+MIN_HISTORY_HOURS = ROLLING_HOURS // 2  # minsta antal kända värden i fönstret innan en timme poängsätts
+STUCK_HOURS = 6                     # antal identiska värden i rad som räknas som fastnad mätare
+SCORE_THRESHOLD = 5.0               # robust z-värde för att flagga en timme
+DOUBLED_MIN_STEP = 2.0              # dubblerat värde: antal MAD-sigma (timskillnader) över båda grannarna
+DOUBLED_TOLERANCE = 1.5             # ... och halva värdet inom så många sigma från grannarna
+BASELOAD_JUMP_RATIO = 1.5
+BASELOAD_MIN_DELTA_KWH = 0.2
+BASELOAD_REFERENCE_WEEKS = 3        # grundlasten jämförs med högsta nivån samma tid de senaste veckorna
+
+
+def read_meter_id(filename: str) -> str:
+    """Läser mätar-ID från rubrikraden i CSV-filen (t.ex. 'TS_735999102106390590'), annars filnamnet."""
+    with open(filename, "r", encoding="utf-8") as f:
+        f.readline()
+        header = f.readline().strip().split(";")
+    if len(header) > 1 and header[1]:
+        return header[1].removesuffix(".cons")
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def load_state(state_file: str) -> Dict[str, dict]:
+    """Läser sparat tillstånd per mätare, eller returnerar ett tomt tillstånd om filen saknas."""
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file, "rb") as f:
+        return pickle.load(f)
+
+
+def save_state(state: Dict[str, dict], state_file: str) -> None:
+    """Sparar tillståndet per mätare (skrivs till temporär fil först)."""
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, state_file)
+
+
+def _utc_hours(df_energy: pd.DataFrame) -> np.ndarray:
+    if "UTC_Hour" in df_energy:
+        return df_energy["UTC_Hour"].to_numpy(dtype=np.int64)
+    return ci.local_to_utc_hour(df_energy["Datetime"], sequential=True)
+
+
+def _hourly_grid(utc_hours: np.ndarray, energy: np.ndarray):
+    # Sammanhängande rutnät över UTC-timmar (inga dubbla eller saknade timmar vid sommar-/vintertid);
+    # timmar utan mätvärde blir NaN. Antalet rader per timme returneras så att dubblerade rader syns.
+    hour0 = int(utc_hours.min())
+    positions = utc_hours - hour0
+    n_hours = int(positions.max()) + 1
+    total = np.bincount(positions, weights=energy, minlength=n_hours)
+    count = np.bincount(positions, minlength=n_hours)
+    return hour0, np.where(count > 0, total, np.nan), count
+
+
+def _trailing_windows(values: np.ndarray, window: int) -> np.ndarray:
+    # Rad i innehåller de `window` värdena före position i (inte värdet självt)
+    padded = np.concatenate([np.full(window, np.nan), values])
+    return sliding_window_view(padded, window)[:len(values)]
+
+
+def _run_lengths(values: np.ndarray) -> np.ndarray:
+    # Längden på serien av identiska värden som slutar vid varje position
+    n = len(values)
+    starts = np.ones(n, dtype=bool)
+    starts[1:] = ~(values[1:] == values[:-1])
+    run_start = np.maximum.accumulate(np.where(starts, np.arange(n), 0))
+    return np.arange(n) - run_start + 1
+
+
+def _robust_sigma(windows: np.ndarray) -> np.ndarray:
+    median = np.nanmedian(windows, axis=1)
+    return 1.4826 * np.nanmedian(np.abs(windows - median[:, None]), axis=1)
+
+
+def _lagged(values: np.ndarray, positions: np.ndarray, lag: int) -> np.ndarray:
+    # values[positions - lag], NaN där historiken inte räcker
+    lags = positions - lag
+    return np.where(lags >= 0, values[np.clip(lags, 0, None)], np.nan)
+
+
+def score_hours(values: np.ndarray, n_new: int, counts: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """
+    Scores the last n_new hours of a contiguous hourly series, using the preceding values as history.
+
+    :param values: Hourly kWh values (history followed by the new hours), NaN for missing hours.
+    :param n_new: Number of new hours at the end of values to score.
+    :param counts: Optional number of meter rows per new hour (see _hourly_grid); more than one is a doubled reading.
+    :return: DataFrame (one row per new hour) with 'Score', 'Stuck', 'Doubled', 'BaseloadJump' and 'Baseline'.
+    """
+    with warnings.catch_warnings():
+        # Fönster med bara NaN (början av historiken) och division med 0 ger förväntade RuntimeWarnings
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+
+        windows = _trailing_windows(values, ROLLING_HOURS)[-n_new:]
+        median = np.nanmedian(windows, axis=1)
+        mad = np.nanmedian(np.abs(windows - median[:, None]), axis=1)
+
+        # För kort historik (ny mätare, långa luckor) ger en meningslös MAD: lämna timmen opoängsatt
+        enough_history = np.count_nonzero(~np.isnan(windows), axis=1) >= MIN_HISTORY_HOURS
+        mad = np.where(enough_history, mad, np.nan)
+        x = values[-n_new:]
+        robust_score = np.abs(x - median) / (1.4826 * mad + 1e-3)
+
+        # Baslinje: median av samma timme i veckan för de föregående veckorna
+        weeks = HISTORY_HOURS // HOURS_PER_WEEK
+        positions = np.arange(len(values) - n_new, len(values))
+        lagged = np.stack([_lagged(values, positions, HOURS_PER_WEEK * week) for week in range(1, weeks + 1)])
+        baseline = np.nanmedian(lagged, axis=0)
+        weekly_score = np.abs(x - baseline) / (1.4826 * mad + 1e-3)
+
+        # Grundlast: lägsta timvärdet senaste dygnet jämfört med den högsta grundlasten samma tid de
+        # senaste veckorna (kalla veckor höjer grundlasten tillfälligt och ska inte räknas som hopp)
+        daily_windows = sliding_window_view(np.concatenate([np.full(23, np.nan), values]), 24)
+        baseload = np.nanmin(daily_windows, axis=1)
+        # Även timmen före de nya behövs, för att bara rapportera när ett hopp börjar
+        jump_positions = np.arange(len(values) - n_new - 1, len(values))
+        baseload_now = _lagged(baseload, jump_positions, 0)
+        baseload_prev = np.max(np.stack([
+            _lagged(baseload, jump_positions, HOURS_PER_WEEK * week)
+            for week in range(1, BASELOAD_REFERENCE_WEEKS + 1)
+        ]), axis=0)
+        jump_condition = (
+            (baseload_now > baseload_prev * BASELOAD_JUMP_RATIO)
+            & (baseload_now - baseload_prev > BASELOAD_MIN_DELTA_KWH)
+        )
+
+        # Dubblerat värde: en enstaka topp över båda grannarna där halva värdet passar både grannarna
+        # och den rullande medianen. Toleransen är MAD-sigma för timskillnader (grannar) resp. nivå (median).
+        # Timmar med samma nivå samma tid tidigare dygn/veckor är återkommande laster, inte dubbleringar.
+        step_sigma = _robust_sigma(_trailing_windows(np.diff(values, prepend=np.nan), ROLLING_HOURS)[-n_new:])
+        step_sigma = np.where(enough_history, step_sigma, np.nan)
+        previous = _lagged(values, positions, 1)
+        following = np.append(values[len(values) - n_new + 1:], np.nan)  # sista timmen har ingen efterföljare än
+        neighbours = np.nanmean(np.stack([previous, following]), axis=0)
+        same_hour = np.stack([_lagged(values, positions, lag) for lag in (24, 48, HOURS_PER_WEEK)])
+        recurring = np.nanmin(np.abs(x - same_hour), axis=0) <= DOUBLED_TOLERANCE * step_sigma
+        doubled = (
+            (x - np.fmax(previous, following) > DOUBLED_MIN_STEP * step_sigma)
+            & (np.abs(x / 2 - neighbours) <= DOUBLED_TOLERANCE * step_sigma)
+            & (np.abs(x / 2 - median) <= 1.4826 * mad)
+            & ~recurring
+        )
+        if counts is not None:
+            # Dubblerade rader i CSV-filen (summeras i _hourly_grid)
+            doubled |= np.asarray(counts)[-n_new:] > 1
+
+    runs = _run_lengths(values)[-n_new:]
+    stuck = (runs >= STUCK_HOURS) & ~np.isnan(x)
+    # Ett hopp rapporteras en gång, den timme villkoret först blir sant
+    baseload_jump = jump_condition[1:] & ~jump_condition[:-1]
+
+    # En timme är avvikande först när den skiljer sig både från den rullande nivån och från
+    # samma timme tidigare veckor (återkommande nattlaster m.m. ska inte flaggas)
+    score = np.fmin(robust_score, weekly_score)
+    score = np.where(stuck, np.fmax(score, runs / STUCK_HOURS * SCORE_THRESHOLD), score)
+    return pd.DataFrame({
+        "Score": score,
+        "Baseline": baseline,
+        "Stuck": stuck,
+        "Doubled": doubled,
+        "BaseloadJump": baseload_jump,
+    })
+
+
+def update_meter(state: Dict[str, dict], meter_id: str, df_energy: pd.DataFrame) -> pd.DataFrame:
+    """
+    Scores the hours of one meter that are newer than the saved state and updates the state.
+
+    :param state: State per meter (see load_state); updated in place.
+    :param meter_id: Identifier of the meter.
+    :param df_energy: Hourly meter data with 'Datetime' and 'Energy_kWh' (from energy_cost.load_energy_data).
+    :return: DataFrame with the flagged new hours: 'Meter', 'Datetime', 'Energy_kWh', 'Score' and the flag columns.
+    """
+    df_energy = df_energy.sort_values("Datetime", kind="stable")
+    utc_hours = _utc_hours(df_energy)
+    energy = df_energy["Energy_kWh"].to_numpy(dtype=float)
+
+    meter_state = state.get(meter_id)
+    if meter_state is not None:
+        keep = utc_hours > meter_state["last_utc_hour"]
+        utc_hours, energy = utc_hours[keep], energy[keep]
+    if len(utc_hours) == 0:
+        return pd.DataFrame()
+
+    hour0, new, counts = _hourly_grid(utc_hours, energy)
+    if meter_state is not None:
+        # Fyll ev. glapp mellan sparad historik och de nya timmarna med NaN
+        gap = np.full(hour0 - meter_state["last_utc_hour"] - 1, np.nan)
+        history = np.concatenate([meter_state["tail"], gap])
+    else:
+        history = np.empty(0)
+
+    values = np.concatenate([history, new])
+    scores = score_hours(values, len(new), counts)
+    wallclock = ci.utc_to_wallclock_hour(np.arange(hour0, hour0 + len(new)))
+    scores.insert(0, "Energy_kWh", new)
+    scores.insert(0, "Datetime", pd.to_datetime(wallclock.astype("datetime64[h]")))
+    scores.insert(0, "Meter", meter_id)
+
+    state[meter_id] = {"last_utc_hour": hour0 + len(new) - 1, "tail": values[-HISTORY_HOURS:]}
+
+    flagged = (scores["Score"] > SCORE_THRESHOLD) | scores["Stuck"] | scores["Doubled"] | scores["BaseloadJump"]
+    return scores[flagged].reset_index(drop=True)
+
+
+def run_nightly(csv_files: Iterable[str], state_file: str, meter_ids: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Runs the incremental anomaly pass over a set of meter CSV files and saves the updated state.
+
+    :param csv_files: Meter CSV files (same format as konsumtion25xx.csv).
+    :param state_file: File where the state per meter is stored between runs.
+    :param meter_ids: Optional meter identifiers, default is read from each CSV header.
+    :return: DataFrame with all flagged hours across meters.
+    """
+    csv_files = list(csv_files)
+    meter_ids = list(meter_ids) if meter_ids is not None else [read_meter_id(f) for f in csv_files]
+    state = load_state(state_file)
+
+    flagged = []
+    for filename, meter_id in zip(csv_files, meter_ids):
+        df_energy = ec.load_energy_data(filename)
+        flagged.append(update_meter(state, meter_id, df_energy))
+
+    save_state(state, state_file)
+    flagged = [df for df in flagged if not df.empty]
+    return pd.concat(flagged, ignore_index=True) if flagged else pd.DataFrame()
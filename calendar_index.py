@@ -0,0 +1,191 @@
+#
+# Gemensamt kalenderindex för alla moduler.
+# Förberäknar per år (och tidszon) kopplingen mellan lokala väggklockstimmar, UTC-timindex,
+# dygnsgränser (23/24/25-timmarsdygn vid sommar-/vintertid) och tariffband, och cachar det som arrayer.
+# Därmed blir join, gruppering per dygn och timuppdelning heltalsaritmetik i stället för
+# upprepade tz_convert/dt.date-anrop.
+#
+# Tidsrepresentation:
+#   UTC-timme        – antal timmar sedan 1970-01-01 00:00 UTC.
+#   väggklockstimme  – antal timmar sedan 1970-01-01 00:00 i lokal (naiv) tid, dvs. som tiderna i CSV/Excel.
+#   dygnsnummer      – antal lokala dygn sedan 1970-01-01.
+#
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from typing import Dict
+
+TIMEZONE = "Europe/Stockholm"
+HOUR_NS = np.int64(3_600_000_000_000)
+EPOCH = pd.Timestamp("1970-01-01")
+
+# Höglasttid för tidstariff: vardagar 06–22 under november–mars
+HIGH_LOAD_MONTHS = (11, 12, 1, 2, 3)
+HIGH_LOAD_HOURS = (6, 22)
+TARIFF_LOW, TARIFF_HIGH = 0, 1
+
+
+@lru_cache(maxsize=None)
+def year_table(year: int, timezone: str = TIMEZONE) -> Dict[str, np.ndarray]:
+    """
+    Förberäknade timtabeller för ett lokalt kalenderår (cachas per år och tidszon, skrivskyddade arrayer).
+
+    En post per verklig timme: 'utc_hour', 'wallclock_hour', 'day', 'hour_of_day', 'weekday' (måndag=0),
+    'month' och 'tariff_band'. En post per lokalt dygn: 'day_start_utc' och 'day_length'.
+    'wall_to_utc' slår upp UTC-timmen för wallclock_hour - 'wallclock0'.
+    """
+    start = pd.Timestamp(year=year, month=1, day=1).tz_localize(timezone)
+    end = pd.Timestamp(year=year + 1, month=1, day=1).tz_localize(timezone)
+    utc_hour = np.arange((start.tz_convert("UTC").tz_localize(None) - EPOCH) // pd.Timedelta(hours=1),
+                         (end.tz_convert("UTC").tz_localize(None) - EPOCH) // pd.Timedelta(hours=1),
+                         dtype=np.int64)
+
+    # Den enda tz_convert-körningen: UTC-timme -> lokal väggklockstimme
+    local = pd.DatetimeIndex(utc_hour * HOUR_NS, tz="UTC").tz_convert(timezone).tz_localize(None)
+    wallclock_hour = local.as_unit("ns").asi8 // HOUR_NS
+
+    day = wallclock_hour // 24
+    hour_of_day = wallclock_hour % 24
+    weekday = (day + 3) % 7  # 1970-01-01 var en torsdag
+    month = day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64) % 12 + 1
+
+    high = (
+        (weekday < 5)
+        & (hour_of_day >= HIGH_LOAD_HOURS[0]) & (hour_of_day < HIGH_LOAD_HOURS[1])
+        & np.isin(month, HIGH_LOAD_MONTHS)
+    )
+    tariff_band = np.where(high, TARIFF_HIGH, TARIFF_LOW).astype(np.int8)
+
+    # Dygnsgränser: första timmen i varje lokalt dygn och dygnets längd (23, 24 eller 25 timmar)
+    day_start = np.flatnonzero(np.diff(day, prepend=day[0] - 1))
+    day_length = np.diff(np.append(day_start, len(day)))
+
+    # Uppslag väggklocka -> UTC. Dubbla timmar (vintertid) ger första förekomsten,
+    # timmar som inte finns (sommartid) ger nästa existerande timme.
+    wallclock0 = int(wallclock_hour.min())
+    size = int(wallclock_hour.max()) - wallclock0 + 1
+    wall_to_utc = np.full(size, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(wall_to_utc, wallclock_hour - wallclock0, utc_hour)
+    wall_to_utc = np.minimum.accumulate(wall_to_utc[::-1])[::-1]
+
+    table = {
+        "utc_hour": utc_hour,
+        "wallclock_hour": wallclock_hour,
+        "day": day,
+        "hour_of_day": hour_of_day,
+        "weekday": weekday,
+        "month": month,
+        "tariff_band": tariff_band,
+        "day_start_utc": utc_hour[day_start],
+        "day_length": day_length,
+        "wallclock0": np.int64(wallclock0),
+        "wall_to_utc": wall_to_utc,
+    }
+    for array in table.values():
+        if isinstance(array, np.ndarray):
+            array.flags.writeable = False
+    return table
+
+
+def _years_of_wallclock(wallclock_hour: np.ndarray) -> np.ndarray:
+    days = (np.asarray(wallclock_hour, dtype=np.int64) // 24).astype("datetime64[D]")
+    return days.astype("datetime64[Y]").astype(np.int64) + 1970
+
+
+def _years_of_utc(utc_hour: np.ndarray, timezone: str) -> np.ndarray:
+    # Ett lokalt år börjar högst 14 timmar från UTC-årsskiftet; kontrollera mot årstabellens start
+    years = _years_of_wallclock(utc_hour)
+    for year in np.unique(years):
+        first_next = year_table(int(year) + 1, timezone)["utc_hour"][0]
+        first = year_table(int(year), timezone)["utc_hour"][0]
+        mask = years == year
+        years[mask & (utc_hour >= first_next)] += 1
+        years[mask & (utc_hour < first)] -= 1
+    return years
+
+
+def wallclock_to_utc_hour(wallclock_hour, timezone: str = TIMEZONE, sequential: bool = False) -> np.ndarray:
+    """
+    Väggklockstimmar -> UTC-timmar via årstabellerna.
+
+    Dubbla timmar vid övergång till vintertid ger första förekomsten och timmar som inte finns
+    (sommartid) nästa existerande timme. Med sequential=True tolkas en dubbel timme som kommer direkt
+    efter sig själv (t.ex. två rader 02:00 i en sorterad mätarserie) som den andra förekomsten.
+    """
+    wallclock_hour = np.asarray(wallclock_hour, dtype=np.int64)
+    utc_hour = np.empty(wallclock_hour.shape, dtype=np.int64)
+    years = _years_of_wallclock(wallclock_hour)
+    for year in np.unique(years):
+        table = year_table(int(year), timezone)
+        mask = years == year
+        positions = np.clip(wallclock_hour[mask] - table["wallclock0"], 0, len(table["wall_to_utc"]) - 1)
+        utc_hour[mask] = table["wall_to_utc"][positions]
+
+    if sequential and wallclock_hour.ndim == 1 and len(wallclock_hour) > 1:
+        repeated = np.flatnonzero(wallclock_hour[1:] == wallclock_hour[:-1]) + 1
+        if len(repeated):
+            # Endast om timmen efter också har samma väggklockstid, dvs. timmen är dubbel
+            later = utc_hour[repeated - 1] + 1
+            ambiguous = utc_to_wallclock_hour(later, timezone) == wallclock_hour[repeated]
+            utc_hour[repeated[ambiguous]] = later[ambiguous]
+    return utc_hour
+
+
+def local_to_utc_hour(datetimes, timezone: str = TIMEZONE, sequential: bool = False) -> np.ndarray:
+    """Lokala (naiva) eller tidszonsmärkta tidpunkter -> UTC-timmar (se wallclock_to_utc_hour)."""
+    values = pd.DatetimeIndex(pd.to_datetime(datetimes))
+    if values.tz is not None:
+        return values.tz_convert("UTC").tz_localize(None).as_unit("ns").asi8 // HOUR_NS
+    return wallclock_to_utc_hour(values.as_unit("ns").asi8 // HOUR_NS, timezone, sequential)
+
+
+def local_to_utc_ns(datetimes, timezone: str = TIMEZONE) -> np.ndarray:
+    """
+    Lokala (naiva) eller tidszonsmärkta tidpunkter -> UTC som int64 ns, med minuter och sekunder kvar.
+    Används för att dela upp intervall (t.ex. laddsessioner) på verkliga timmar över sommar-/vintertid.
+    """
+    values = pd.DatetimeIndex(pd.to_datetime(datetimes))
+    if values.tz is not None:
+        return values.tz_convert("UTC").tz_localize(None).as_unit("ns").asi8
+    ns = values.as_unit("ns").asi8
+    return wallclock_to_utc_hour(ns // HOUR_NS, timezone) * HOUR_NS + ns % HOUR_NS
+
+
+def utc_to_wallclock_hour(utc_hour, timezone: str = TIMEZONE) -> np.ndarray:
+    """UTC-timmar -> lokala väggklockstimmar."""
+    return _lookup_by_utc(utc_hour, "wallclock_hour", timezone)
+
+
+def utc_hour_to_day(utc_hour, timezone: str = TIMEZONE) -> np.ndarray:
+    """UTC-timmar -> lokalt dygnsnummer (dagar sedan 1970-01-01)."""
+    return utc_to_wallclock_hour(utc_hour, timezone) // 24
+
+
+def tariff_band(utc_hour, timezone: str = TIMEZONE) -> np.ndarray:
+    """UTC-timmar -> tariffband (TARIFF_HIGH under höglasttid, annars TARIFF_LOW)."""
+    return _lookup_by_utc(utc_hour, "tariff_band", timezone)
+
+
+def _lookup_by_utc(utc_hour, column: str, timezone: str) -> np.ndarray:
+    utc_hour = np.asarray(utc_hour, dtype=np.int64)
+    years = _years_of_utc(utc_hour, timezone)
+    result = np.empty(utc_hour.shape, dtype=year_table(1970, timezone)[column].dtype)
+    for year in np.unique(years):
+        table = year_table(int(year), timezone)
+        mask = years == year
+        result[mask] = table[column][utc_hour[mask] - table["utc_hour"][0]]
+    return result
+
+
+def day_starts_utc(first_day: int, last_day: int, timezone: str = TIMEZONE) -> np.ndarray:
+    """
+    UTC-timmen för början av varje lokalt dygn från first_day till och med last_day + 1
+    (dygnsnummer), dvs. gränserna för att summera per dygn med prefixsummor.
+    """
+    days = np.arange(first_day, last_day + 2, dtype=np.int64)
+    return wallclock_to_utc_hour(days * 24, timezone, sequential=False)
+
+
+def utc_hour_to_timestamp(utc_hour: int) -> pd.Timestamp:
+    """En UTC-timme -> tidszonsmärkt pd.Timestamp i UTC."""
+    return pd.Timestamp(int(utc_hour) * HOUR_NS, tz="UTC")
@@ -1,23 +1,35 @@
 import sys
 import json
 import requests
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta, timezone
-from typing import List, Set, Tuple
+from datetime import datetime, timedelta
+from typing import List, Optional, Set, Tuple
+from session_ingest import DEFAULT_CACHE_DIR, load_session_sheet_cached
+from price_gapfill import complete_price_grid, fill_price_gaps
+from cost_cache import (
+    DEFAULT_MAX_ENTRIES, load_cost_cache, price_day_versions, save_cost_cache, session_days, session_fingerprint
+)
+import calendar_index as ci
+
+_TEST = False   # Debugutskrift, sätts till True i huvudprogrammet
 
 # Read charging session data from an Excel file
-def load_charging_sessions(file_path: str, sheet_name: str = "InputData") -> Tuple[pd.DataFrame, int, int]:
+def load_charging_sessions(
+    file_path: str,
+    sheet_name: str = "InputData",
+    cache_dir: Optional[str] = DEFAULT_CACHE_DIR
+) -> Tuple[pd.DataFrame, int, int]:
     """
     Reads charging session data from an Excel file and checks that all sessions belong to the same month.
+    Only the Start, End and Consumption columns are read (streaming), and unchanged files are served from cache.
 
     :param file_path: Path to the Excel file.
     :param sheet_name: Name of the worksheet to read from (default is "InputData").
+    :param cache_dir: Directory for cached parse results, or None to always reread the file.
     :return: Tuple of (DataFrame with charging sessions, year, month)
     """
-    df = pd.read_excel(file_path, sheet_name=sheet_name)
-    df["Start"] = pd.to_datetime(df["Start"])
-    df["End"] = pd.to_datetime(df["End"])
-    df["Consumption"] = df["Consumption"].astype(float)
+    df = load_session_sheet_cached(file_path, sheet_name, cache_dir)
 
     # Kombinera start och slutdatum till en lista av alla involverade datum
     all_dates = pd.concat([df["Start"], df["End"]]).dt.to_period("M")
@@ -63,14 +75,25 @@ def load_hourly_prices(json_file: str) -> dict:
 #
 # Calculate the cost of charging based on hourly prices
 #
-def fetch_monthly_prices_from_api(year: int, month: int, elområde: str = "SE3") -> pd.DataFrame:
+def fetch_monthly_prices_from_api(
+    year: int,
+    month: int,
+    elområde: str = "SE3",
+    fill_strategy: Optional[str] = "previous_day",
+    history: Optional[pd.DataFrame] = None
+) -> pd.DataFrame:
     """
     Fetches hourly electricity prices for an entire month from the 'elprisetjustnu' API.
+    Hours that could not be fetched are filled using fill_strategy and flagged as provisional.
 
     :param year: Year of interest (e.g., 2025).
     :param month: Month of interest (1–12).
     :param elområde: Electricity price area (e.g., "SE3", "SE1", "SE2", "SE4").
-    :return: A DataFrame with columns "DateTime" and the selected elområde column (e.g., "SE3").
+    :param fill_strategy: Gap-filling strategy (see price_gapfill.FILL_STRATEGIES), or None to only return fetched hours.
+    :param history: Optional DataFrame with earlier cached prices used by the gap-filling strategy
+                    (with fill_strategy, also used to fill the whole month if no day could be fetched).
+    :return: A DataFrame with columns "DateTime", the selected elområde column (e.g., "SE3"),
+             and, when filling, "Provisional" and "FillMethod".
     """
     # Lista för att samla dagspriser
     all_data = []
@@ -96,13 +119,54 @@ def fetch_monthly_prices_from_api(year: int, month: int, elområde: str = "SE3")
         df[elområde] = df["SEK_per_kWh"]
         all_data.append(df[["DateTime", elområde]])
 
-    if not all_data:
+    if all_data:
+        # Slå ihop allt till en enda DataFrame
+        full_df = pd.concat(all_data).sort_values("DateTime").reset_index(drop=True)
+    elif fill_strategy is not None and history is not None and len(history):
+        # Inget hämtades: hela månaden fylls i från historiken i stället för att stoppa körningen
+        print("⚠️  Ingen data kunde hämtas från API:et, hela månaden fylls i från historiken.")
+        full_df = pd.DataFrame({
+            "DateTime": pd.Series(dtype=f"datetime64[ns, {ci.TIMEZONE}]"),
+            elområde: pd.Series(dtype=float),
+        })
+    else:
         raise ValueError("Ingen data kunde hämtas från API:et.")
 
-    # Slå ihop allt till en enda DataFrame
-    full_df = pd.concat(all_data).sort_values("DateTime").reset_index(drop=True)
+    if fill_strategy is not None:
+        # Lägg ut priserna på alla timmar i månaden och fyll i de som saknas
+        full_df = complete_price_grid(full_df, year, month, price_column=elområde)
+        missing_hours = int(full_df["Provisional"].sum())
+        if missing_hours:
+            print(f"⚠️  {missing_hours} timmar saknar pris och fylls i med strategin '{fill_strategy}' (preliminärt).")
+        full_df = fill_price_gaps(full_df, price_column=elområde, strategy=fill_strategy, history=history)
+
     return full_df
 #
+# Session times in UTC
+#
+def _to_utc(time):
+    """
+    Returns time as a tz-aware UTC timestamp. Naive times are local wall-clock time and are mapped
+    through the shared calendar index, so sessions are split over the real hours (DST-correct).
+    UTC hour starts are also the keys used to look up prices in a price dictionary.
+    """
+    time = pd.Timestamp(time)
+    if time.tzinfo is not None:
+        return time.tz_convert("UTC")
+    return pd.Timestamp(int(ci.local_to_utc_ns([time])[0]), tz="UTC")
+
+def _session_hours(start_time, end_time):
+    """
+    Returns the price keys (UTC hour starts) for all hours touched by a charging session.
+    """
+    start_time, end_time = _to_utc(start_time), _to_utc(end_time)
+    keys = []
+    current = start_time.floor("h")
+    while current < end_time:
+        keys.append(current)
+        current += timedelta(hours=1)
+    return keys
+#
 # Calculate the cost of charging based on hourly prices
 #
 def calculate_charging_cost(start_time, end_time, energy_kwh, price_data):
@@ -110,15 +174,17 @@ def calculate_charging_cost(start_time, end_time, energy_kwh, price_data):
     Calculates the cost of charging an electric vehicle over a specified time interval.
 
     Parameters:
-        start_time (datetime): Local start time of the charging session.
-        end_time (datetime): Local end time of the charging session.
+        start_time (datetime): Start time of the charging session (naive local time or tz-aware).
+        end_time (datetime): End time of the charging session (naive local time or tz-aware).
         energy_kwh (float): Total energy to be charged during the session (in kWh).
-        price_data (dict): Dictionary of hourly electricity prices with keys as UTC ISO8601 strings 
-                           (e.g., '2025-03-01T01:00:00+00:00') and values as prices in SEK/kWh.
+        price_data (dict): Dictionary of hourly electricity prices with tz-aware hour-start timestamps as keys
+                           (e.g., the 'DateTime' column from fetch_monthly_prices_from_api) and values as prices in SEK/kWh.
 
     Returns:
         float: Total cost for the charging session (rounded to 4 decimal places).
     """
+    # Dela upp sessionen på verkliga (UTC-)timmar, så att sommar-/vintertid ger rätt längd
+    start_time, end_time = _to_utc(start_time), _to_utc(end_time)
     if start_time >= end_time:
         return 0.0
 
@@ -126,7 +192,8 @@ def calculate_charging_cost(start_time, end_time, energy_kwh, price_data):
     total_cost = 0.0
     total_energy_check = 0.0
 
-    current = start_time.replace(minute=0, second=0, microsecond=0)
+    current = start_time.floor("h")
+    missing_hours = []
 
     while current < end_time:
         next_hour = current + timedelta(hours=1)
@@ -137,17 +204,17 @@ def calculate_charging_cost(start_time, end_time, energy_kwh, price_data):
         energy_fraction = energy_kwh * (duration_seconds / total_seconds)
 
         # Match UTC time to price_data keys
-        current_utc = current.replace(tzinfo=timezone.utc)
- #      key = current_utc.isoformat()
-        key = current_utc
-        price = price_data.get(key, 0.0)
+        price = price_data.get(current)
+        if price is None:
+            missing_hours.append(current)
+            price = 0.0
         cost = energy_fraction * price
 
         total_cost += cost
         total_energy_check += energy_fraction
 
         if _TEST:
-            print(f"Timme: {current} -> {next_hour}")
+            print(f"Timme: {current.tz_convert(ci.TIMEZONE)} -> {next_hour.tz_convert(ci.TIMEZONE)}")
             print(f"  Period: {period_start.time()} - {period_end.time()} ({int(duration_seconds)} s)")
             print(f"  Energiandel: {energy_fraction:.5f} kWh")
             print(f"  Använt pris (SEK/kWh): {price}")
@@ -155,6 +222,12 @@ def calculate_charging_cost(start_time, end_time, energy_kwh, price_data):
 
         current = next_hour
 
+    if missing_hours:
+        # En varning per session, inte per timme
+        print(f"⚠️  Pris saknas för {len(missing_hours)} timmar i sessionen "
+              f"{start_time.tz_convert(ci.TIMEZONE)} - {end_time.tz_convert(ci.TIMEZONE)} "
+              f"(från {missing_hours[0].tz_convert(ci.TIMEZONE)}), räknas som 0 SEK/kWh.")
+
     if _TEST:
         print(f"Totalt summerad energi: {total_energy_check:.5f} kWh (förväntat: {energy_kwh} kWh)")
         print(f"Total kostnad: {total_cost:.2f} SEK")
@@ -167,15 +240,22 @@ def calculate_charging_cost(start_time, end_time, energy_kwh, price_data):
 def calculate_all_charging_costs(   
     df_sessions: pd.DataFrame,
     price_df: pd.DataFrame,
-    price_column: str = "SE3"
+    price_column: str = "SE3",
+    cache_file: Optional[str] = None,
+    max_cache_entries: int = DEFAULT_MAX_ENTRIES
 ) -> pd.DataFrame:
     """
     Calculates the charging cost for all sessions in the DataFrame using hourly electricity prices.
+    With cache_file, sessions whose start, end, energy and price version of the covered days are unchanged
+    since an earlier run are taken from the cache instead of being recalculated.
 
-    :param df_sessions: DataFrame with columns 'Start', 'End', and 'Consumption'
+    :param df_sessions: DataFrame with columns 'Start', 'End', and 'Consumption' (not modified)
     :param price_df: DataFrame with hourly prices. Must contain 'DateTime' and a column for the selected price zone (e.g., 'SE3')
     :param price_column: Column name for the electricity price zone to use (default is 'SE3')
+    :param cache_file: Path to a persistent per-session cost cache, or None to disable caching
+    :param max_cache_entries: Maximum number of sessions kept in the cache (least recently used are evicted)
     :return: A new DataFrame identical to df_sessions but with an extra column 'ChargingCost'
+             (and 'PriceStatus' = "provisional"/"final" if price_df has a 'Provisional' column)
     """
     # Skapa en dictionary med priser för snabbare uppslag i beräkningarna
     price_data = dict(
@@ -185,26 +265,103 @@ def calculate_all_charging_costs(
         )
     )
 
-    # Lista för att samla alla kostnader
+    with_status = "Provisional" in price_df
+    if with_status:
+        provisional_keys = set(price_df.loc[price_df["Provisional"].astype(bool), "DateTime"])
+
+    use_cache = cache_file is not None
+    if use_cache:
+        cache = load_cost_cache(cache_file)
+        # Prisversion per dygn beräknas en gång; varje session slår bara upp sina (oftast 1–2) dygn
+        day_versions = price_day_versions(price_df, price_column)
+        first_days, last_days = session_days(df_sessions["Start"], df_sessions["End"])
+    else:
+        first_days = last_days = np.zeros(len(df_sessions), dtype=np.int64)
+    recalculated = 0
+
+    # Listor för att samla alla kostnader och prisstatusar
     costs = []
-
-    for index, row in df_sessions.iterrows():
-        start_time = row["Start"]
-        end_time = row["End"]
-        energy = row["Consumption"]
+    statuses = []
+
+    for index, start_time, end_time, energy, first_day, last_day in zip(
+        df_sessions.index, df_sessions["Start"], df_sessions["End"], df_sessions["Consumption"],
+        first_days, last_days
+    ):
+        if use_cache:
+            versions = [day_versions.get(day, "") for day in range(int(first_day), int(last_day) + 1)]
+            fingerprint = session_fingerprint(start_time, end_time, energy, versions)
+            cached = cache.get(fingerprint)
+            if cached is not None:
+                cache.move_to_end(fingerprint)
+                costs.append(cached[0])
+                statuses.append(cached[1])
+                continue
 
         try:
             cost = calculate_charging_cost(start_time, end_time, energy, price_data)
+            recalculated += 1
         except Exception as e:
             print(f"Fel vid beräkning av session på rad {index}: {e}")
             cost = None  # eller 0.0 om du föredrar det
 
+        status = None
+        if with_status:
+            hours = _session_hours(start_time, end_time)
+            status = "provisional" if any(key in provisional_keys for key in hours) else "final"
+
+        if use_cache and cost is not None:
+            cache[fingerprint] = (cost, status)
         costs.append(cost)
+        statuses.append(status)
 
-    # Lägg till kolumnen i den ursprungliga DataFramen
+    if use_cache:
+        save_cost_cache(cache, cache_file, max_cache_entries)
+        if _TEST:
+            print(f"Kostnadscache: {recalculated} av {len(df_sessions)} sessioner beräknades om.")
+
+    # Lägg till kolumnerna i en kopia så att indata inte ändras
+    df_sessions = df_sessions.copy()
     df_sessions["ChargingCost"] = costs
+
+    if with_status:
+        df_sessions["PriceStatus"] = statuses
     return df_sessions
 
+#
+# Re-cost only sessions that used provisional prices
+#
+def recost_provisional_sessions(
+    df_result: pd.DataFrame,
+    price_df: pd.DataFrame,
+    price_column: str = "SE3"
+) -> pd.DataFrame:
+    """
+    Recalculates the cost of sessions marked as provisional, e.g. after real prices replaced filled ones
+    (see price_gapfill.merge_final_prices). Final sessions are left untouched.
+
+    :param df_result: Result from calculate_all_charging_costs with 'ChargingCost' and 'PriceStatus'.
+    :param price_df: Updated DataFrame with 'DateTime', the price column and optionally 'Provisional'
+                     (without it, all its prices are treated as final).
+    :param price_column: Column name for the electricity price zone to use (default is 'SE3')
+    :return: A new DataFrame with updated 'ChargingCost' and 'PriceStatus' for the previously provisional sessions.
+    """
+    df_result = df_result.copy()
+    todo = df_result["PriceStatus"] == "provisional"
+    if not todo.any():
+        return df_result
+
+    # Utan den gamla statusen i delmängden, så att den inte följer med om price_df saknar 'Provisional'
+    df_updated = calculate_all_charging_costs(
+        df_result.loc[todo].drop(columns="PriceStatus"), price_df, price_column
+    )
+    df_result.loc[todo, "ChargingCost"] = df_updated["ChargingCost"]
+    if "PriceStatus" in df_updated:
+        df_result.loc[todo, "PriceStatus"] = df_updated["PriceStatus"]
+    else:
+        # Priser utan preliminär-flagga (t.ex. hämtade med fill_strategy=None) räknas som slutliga
+        df_result.loc[todo, "PriceStatus"] = "final"
+    return df_result
+
 #
 # Extract unique months from the DataFrame
 #
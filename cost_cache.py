@@ -0,0 +1,128 @@
+#
+# Beständig cache för laddkostnad per session.
+# Nyckeln är ett fingeravtryck av sessionen (start, slut, kWh) och prisversionen för de lokala dygn den
+# täcker, så att en omkörning av månaden bara räknar om sessioner som är nya eller vars priser har ändrats.
+# Prisversionen beräknas en gång per körning och dygn, så en cacheträff kostar inte en genomgång per timme.
+#
+import os
+import pickle
+import hashlib
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence, Tuple
+
+import calendar_index as ci
+
+DEFAULT_MAX_ENTRIES = 100_000
+
+
+def price_day_versions(
+    price_df: pd.DataFrame,
+    price_column: str = "SE3",
+    timezone: str = ci.TIMEZONE
+) -> Dict[int, str]:
+    """
+    Returns a version id per local day of the price series: a hash of that day's hours, prices
+    and provisional flags. Any change to a day's prices gives the day a new id.
+
+    :param price_df: DataFrame with 'DateTime', the price column and optionally 'Provisional'.
+    :param price_column: Column name for the electricity price zone (default is 'SE3').
+    :param timezone: Time zone for the day boundaries (default is Europe/Stockholm).
+    :return: Dictionary from local day number (days since 1970-01-01) to version id.
+    """
+    if price_df.empty:
+        return {}
+    utc_hours = ci.local_to_utc_hour(price_df["DateTime"], timezone)
+    prices = price_df[price_column].to_numpy(dtype=float)
+    if "Provisional" in price_df:
+        provisional = price_df["Provisional"].to_numpy(dtype=bool)
+    else:
+        provisional = np.zeros(len(price_df), dtype=bool)
+
+    # Sortera per dygn och timme och dela upp i dygnsskivor (en hash per dygn, inte per timme)
+    days = ci.utc_hour_to_day(utc_hours, timezone)
+    order = np.lexsort((utc_hours, days))
+    days, utc_hours, prices, provisional = days[order], utc_hours[order], prices[order], provisional[order]
+    starts = np.flatnonzero(np.diff(days, prepend=days[0] - 1))
+    ends = np.append(starts[1:], len(days))
+
+    versions = {}
+    for start, end in zip(starts, ends):
+        digest = hashlib.sha1(utc_hours[start:end].tobytes())
+        digest.update(prices[start:end].tobytes())
+        digest.update(provisional[start:end].tobytes())
+        versions[int(days[start])] = digest.hexdigest()
+    return versions
+
+
+def session_days(starts, ends, timezone: str = ci.TIMEZONE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the first and last local day number covered by each session (vectorized).
+
+    :param starts: Session start times (naive local time or tz-aware).
+    :param ends: Session end times (exclusive).
+    :return: Tuple of (first day, last day) arrays.
+    """
+    starts = pd.to_datetime(pd.Series(starts))
+    ends = pd.to_datetime(pd.Series(ends))
+    first_day = ci.utc_hour_to_day(ci.local_to_utc_hour(starts, timezone), timezone)
+    # Sluttiden ingår inte: en session som slutar exakt vid midnatt täcker inte nästa dygn
+    last_end = (ends - pd.Timedelta(microseconds=1)).where(ends > starts, starts)
+    last_day = ci.utc_hour_to_day(ci.local_to_utc_hour(last_end, timezone), timezone)
+    return first_day, last_day
+
+
+def session_fingerprint(start_time, end_time, energy_kwh: float, price_versions: Sequence[str]) -> str:
+    """
+    Returns a fingerprint of a charging session together with the price versions of the days it covers.
+
+    :param start_time: Start time of the session.
+    :param end_time: End time of the session.
+    :param energy_kwh: Energy charged during the session (kWh).
+    :param price_versions: Price version id per covered local day, in order (see price_day_versions).
+    :return: Hex digest used as cache key.
+    """
+    text = repr((str(start_time), str(end_time), float(energy_kwh), tuple(price_versions)))
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def load_cost_cache(cache_file: Optional[str]) -> "OrderedDict[str, tuple]":
+    """
+    Reads the session cost cache, or returns an empty cache if the file is missing or unreadable.
+
+    :param cache_file: Path to the cache file, or None for an in-memory cache only.
+    :return: OrderedDict from fingerprint to (cost, price status), least recently used first.
+    """
+    if cache_file is None or not os.path.exists(cache_file):
+        return OrderedDict()
+    try:
+        with open(cache_file, "rb") as f:
+            return pickle.load(f)
+    except Exception as e:
+        print(f"Kunde inte läsa kostnadscachen {cache_file}: {e}")
+        return OrderedDict()
+
+
+def save_cost_cache(
+    cache: "OrderedDict[str, tuple]",
+    cache_file: Optional[str],
+    max_entries: int = DEFAULT_MAX_ENTRIES
+) -> None:
+    """
+    Evicts the least recently used entries above max_entries and writes the cache to disk.
+
+    :param cache: Cache from load_cost_cache (modified in place by the eviction).
+    :param cache_file: Path to the cache file, or None to skip writing.
+    :param max_entries: Maximum number of sessions kept in the cache.
+    """
+    while len(cache) > max_entries:
+        cache.popitem(last=False)
+    if cache_file is None:
+        return
+
+    # Skriv till temporär fil först så att en avbruten körning aldrig lämnar en trasig cache
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "wb") as f:
+        pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, cache_file)
@@ -0,0 +1,129 @@
+#
+# Delar upp husets timförbrukning (mätardata från konsumtion25xx.csv) i hushåll och elbilsladdning
+# genom att lägga ut laddsessionerna på samma timrutnät som mätarserien och subtrahera.
+# Allt görs med sorterade arrayer (searchsorted/bincount) utan Python-loop per timme.
+#
+import numpy as np
+import pandas as pd
+from typing import Optional, Tuple
+
+import calendar_index as ci
+
+def expand_sessions_hourly(
+    starts,
+    ends,
+    energy_kwh
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Splits charging sessions into per-hour energy, assuming constant power during each session.
+    Start and end are mapped to UTC through the calendar index first, so the split follows the real
+    hours (a session over the switch to summer time is one hour shorter than its wall-clock span).
+
+    :param starts: Session start times (naive local time or tz-aware).
+    :param ends: Session end times (naive local time or tz-aware).
+    :param energy_kwh: Energy charged per session (kWh).
+    :return: Tuple of (session index, UTC hour start as int64 ns, kWh in that hour), one entry per session-hour.
+    """
+    return expand_hours_ns(ci.local_to_utc_ns(starts), ci.local_to_utc_ns(ends), np.asarray(energy_kwh, dtype=float))
+
+
+def expand_hours_ns(
+    start_ns: np.ndarray,
+    end_ns: np.ndarray,
+    energy: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Same as expand_sessions_hourly but for start/end already given as int64 nanoseconds
+    (used by the batched simulation engine).
+    """
+    valid = end_ns > start_ns
+    session_idx = np.flatnonzero(valid)
+    start_ns, end_ns, energy = start_ns[valid], end_ns[valid], energy[valid]
+
+    first_hour = start_ns - start_ns % ci.HOUR_NS
+    n_hours = -(-(end_ns - first_hour) // ci.HOUR_NS)  # avrundning uppåt
+
+    # En rad per (session, timme): upprepa sessionen och räkna upp timoffset inom sessionen
+    rows = np.repeat(np.arange(len(start_ns)), n_hours)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(n_hours) - n_hours, n_hours)
+    hour_start = first_hour[rows] + offsets * ci.HOUR_NS
+
+    overlap = np.minimum(hour_start + ci.HOUR_NS, end_ns[rows]) - np.maximum(hour_start, start_ns[rows])
+    kwh = energy[rows] * overlap / (end_ns - start_ns)[rows]
+
+    return session_idx[rows], hour_start, kwh
+
+
+def disaggregate_household_ev(
+    df_energy: pd.DataFrame,
+    df_sessions: pd.DataFrame,
+    price_column: Optional[str] = "Price_SEK_per_kWh",
+    tolerance_kwh: float = 0.01
+) -> pd.DataFrame:
+    """
+    Splits hourly metered energy into EV charging and household load.
+
+    :param df_energy: Hourly meter data with 'Datetime' and 'Energy_kWh' (from energy_cost.load_energy_data,
+                      or energy_cost.merge_energy_prices to also get costs).
+    :param df_sessions: Charging sessions with 'Start', 'End' and 'Consumption' (kWh).
+    :param price_column: Price column in df_energy used for cost split, ignored if missing (default 'Price_SEK_per_kWh').
+    :param tolerance_kwh: Margin before session energy is considered to exceed the metered energy.
+    :return: A new DataFrame with the meter rows plus 'EV_kWh' (capped at the metered energy),
+             'EV_Excess_kWh' (session energy above the meter), 'Household_kWh', 'EV_Exceeds_Meter',
+             'Tariff_Band' (calendar_index.TARIFF_HIGH during high-load hours) and, if prices are
+             available, 'EV_Cost_SEK' and 'Household_Cost_SEK'.
+    """
+    df = df_energy.sort_values("Datetime", kind="stable").reset_index(drop=True)
+    if "UTC_Hour" in df:
+        meter_hours = df["UTC_Hour"].to_numpy(dtype=np.int64)
+    else:
+        meter_hours = ci.local_to_utc_hour(df["Datetime"], sequential=True)
+
+    _, hour_ns, kwh = expand_sessions_hourly(df_sessions["Start"], df_sessions["End"], df_sessions["Consumption"])
+    session_hours = hour_ns // ci.HOUR_NS
+
+    # Koppla varje sessionstimme till mätarraden med samma UTC-timme
+    pos = np.searchsorted(meter_hours, session_hours)
+    in_range = pos < len(meter_hours)
+    matched = np.zeros(len(session_hours), dtype=bool)
+    matched[in_range] = meter_hours[pos[in_range]] == session_hours[in_range]
+    if not matched.all():
+        print(f"⚠️  {kwh[~matched].sum():.3f} kWh laddning ligger utanför mätarseriens timmar och ignoreras.")
+
+    session_kwh = np.bincount(pos[matched], weights=kwh[matched], minlength=len(df))
+    metered = df["Energy_kWh"].to_numpy(dtype=float)
+
+    # Elbilsandelen kan inte vara större än det som mätts upp; överskottet redovisas separat
+    ev_kwh = np.minimum(session_kwh, np.clip(metered, 0.0, None))
+    df["EV_kWh"] = ev_kwh
+    df["EV_Excess_kWh"] = session_kwh - ev_kwh
+    df["EV_Exceeds_Meter"] = session_kwh > metered + tolerance_kwh
+    df["Household_kWh"] = np.clip(metered - ev_kwh, 0.0, None)
+    df["Tariff_Band"] = ci.tariff_band(meter_hours)
+
+    if price_column is not None and price_column in df:
+        price = df[price_column].to_numpy(dtype=float)
+        df["EV_Cost_SEK"] = df["EV_kWh"] * price
+        df["Household_Cost_SEK"] = df["Household_kWh"] * price
+
+    return df
+
+
+def daily_disaggregation(df_hourly: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sums the hourly household/EV split per day.
+
+    :param df_hourly: Result from disaggregate_household_ev.
+    :return: DataFrame per 'Date' with energy (and cost) sums, EV energy during high-load tariff hours
+             ('EV_HighLoad_kWh') and the number of hours where EV exceeded the meter.
+    """
+    columns = [c for c in ("Energy_kWh", "EV_kWh", "EV_Excess_kWh", "Household_kWh",
+                           "Cost_SEK", "EV_Cost_SEK", "Household_Cost_SEK")
+               if c in df_hourly]
+    dates = df_hourly["Date"] if "Date" in df_hourly else df_hourly["Datetime"].dt.date
+    df_daily = df_hourly.groupby(dates)[columns].sum()
+    if "Tariff_Band" in df_hourly:
+        high_load = np.where(df_hourly["Tariff_Band"] == ci.TARIFF_HIGH, df_hourly["EV_kWh"], 0.0)
+        df_daily["EV_HighLoad_kWh"] = pd.Series(high_load, index=df_hourly.index).groupby(dates).sum()
+    df_daily["EV_Exceeds_Hours"] = df_hourly.groupby(dates)["EV_Exceeds_Meter"].sum()
+    return df_daily.rename_axis("Date").reset_index()
@@ -1,9 +1,11 @@
 # Slutversion av energikostnadsberäkning
 # Hämtar elpriser från API och läser in energiförbrukning från CSV-fil
 #
+import numpy as np
 import pandas as pd
 import requests
 import os 
+import calendar_index as ci
 
 def load_energy_data(filename):
     """Läser in CSV-fil med energiförbrukning timme för timme och returnerar en DataFrame."""
@@ -12,8 +14,12 @@ def load_energy_data(filename):
     # Konvertera Datetime-kolumnen till datetime-format
     df["Datetime"] = pd.to_datetime(df["Datetime"], format="%Y-%m-%d %H:%M")
     
+    # UTC-timindex från det gemensamma kalenderindexet (dubbla timmar vid vintertid i ordning)
+    utc_hours = ci.local_to_utc_hour(df["Datetime"], sequential=True)
+
     # Extrahera datum (utan tid) för gruppering
-    df["Date"] = df["Datetime"].dt.date  
+    df["Date"] = ci.utc_hour_to_day(utc_hours).astype("datetime64[D]").astype(object)
+    df["UTC_Hour"] = utc_hours
     
     return df
 
@@ -47,21 +53,111 @@ def fetch_prices_for_dates(dates, price_area="SE3"):
 # 3. Borttagning av tidszonsinformation: Vi tar bort tidszonen så att datumen blir jämförbara med de i df_energy.
 
     df_prices["Datetime"] = pd.to_datetime(df_prices["Datetime"], utc=True, errors="coerce")
-    df_prices["Datetime"] = df_prices["Datetime"].dt.tz_convert("Europe/Stockholm")
-    df_prices["Datetime"] = df_prices["Datetime"].dt.tz_localize(None)
+    df_prices = df_prices.dropna(subset=["Datetime"])
+    # UTC-timmen priset gäller (kvartspriser får samma timme som sin timstart)
+    df_prices["UTC_Hour"] = ci.local_to_utc_hour(df_prices["Datetime"])
+    df_prices["Datetime"] = df_prices["Datetime"].dt.tz_convert(ci.TIMEZONE).dt.tz_localize(None)
 
     return df_prices
 
 def merge_energy_prices(df_energy, df_prices):
-    """Mergar energiförbrukning och elpriser baserat på 'Datetime' och beräknar elkostnad per timme."""
-    df_merged = df_energy.merge(df_prices, on="Datetime", how="inner")
+    """Mergar energiförbrukning och elpriser baserat på UTC-timme (annars 'Datetime') och beräknar elkostnad per timme."""
+    if "UTC_Hour" in df_energy and "UTC_Hour" in df_prices:
+        # Timpris = medel av timmens kvartspriser, så att varje mätartimme matchar exakt en prisrad
+        hourly_prices = df_prices.groupby("UTC_Hour", as_index=False)["Price_SEK_per_kWh"].mean()
+        df_merged = df_energy.merge(hourly_prices, on="UTC_Hour", how="inner")
+    else:
+        df_merged = df_energy.merge(df_prices, on="Datetime", how="inner")
     df_merged["Cost_SEK"] = df_merged["Energy_kWh"] * df_merged["Price_SEK_per_kWh"]
     return df_merged
 
+def local_to_utc_hour(datetimes, timezone=ci.TIMEZONE):
+    """Omvandlar lokala (naiva) tidpunkter till heltal: antal timmar sedan 1970-01-01 00:00 UTC."""
+    # Dubbla timmar vid övergång till vintertid tolkas i den ordning de kommer
+    return ci.local_to_utc_hour(datetimes, timezone, sequential=True)
+
+def build_cost_index(df_merged):
+    """
+    Bygger prefixsummor av energi och kostnad över ett sammanhängande UTC-timindex.
+
+    Summan för timmarna [i, j) är prefix[j] - prefix[i], så energi, kostnad och medelpris
+    för valfritt tidsintervall fås med två uppslag (se range_summary). "count" räknar timmar med
+    mätvärde, så att perioder som saknas helt i datat kan utelämnas.
+    """
+    if "UTC_Hour" in df_merged:
+        hours = df_merged["UTC_Hour"].to_numpy(dtype=np.int64)
+    else:
+        hours = local_to_utc_hour(df_merged["Datetime"])
+    hour0 = int(hours.min())
+    positions = hours - hour0
+    n_hours = int(positions.max()) + 1
+
+    # Saknade timmar blir 0; eventuella dubbletter summeras. NaN räknas som 0 (som groupby().sum())
+    # så att ett enstaka saknat värde inte förstör alla följande prefixsummor
+    energy_weights = np.nan_to_num(df_merged["Energy_kWh"].to_numpy(dtype=float))
+    cost_weights = np.nan_to_num(df_merged["Cost_SEK"].to_numpy(dtype=float))
+    energy = np.bincount(positions, weights=energy_weights, minlength=n_hours)
+    cost = np.bincount(positions, weights=cost_weights, minlength=n_hours)
+    count = np.bincount(positions, minlength=n_hours)
+
+    return {
+        "hour0": hour0,
+        "energy": np.concatenate([[0.0], np.cumsum(energy)]),
+        "cost": np.concatenate([[0.0], np.cumsum(cost)]),
+        "count": np.concatenate([[0], np.cumsum(count)]),
+    }
+
+def _prefix_positions(cost_index, utc_hours):
+    """Position i prefixarrayerna för givna UTC-timmar (begränsad till indexets omfång)."""
+    n_hours = len(cost_index["energy"]) - 1
+    return np.clip(np.asarray(utc_hours, dtype=np.int64) - cost_index["hour0"], 0, n_hours)
+
+def range_summary(cost_index, start, end):
+    """Energi, kostnad och medelpris för timmarna från start till (men inte med) end, lokal tid."""
+    i, j = _prefix_positions(cost_index, ci.local_to_utc_hour([start, end]))
+    energy = cost_index["energy"][j] - cost_index["energy"][i]
+    cost = cost_index["cost"][j] - cost_index["cost"][i]
+    return {
+        "Energy_kWh": energy,
+        "Cost_SEK": cost,
+        "Avg_price_SEK_per_kWh": cost / energy if energy else float("nan"),
+    }
+
+def period_summary(cost_index, freq="D", timezone=ci.TIMEZONE):
+    """
+    Summerar energi och kostnad per dag ("D"), vecka ("W") eller månad ("M") i lokal tid
+    som differenser av prefixarrayerna, utan groupby. Perioder utan någon timme i datat tas inte med.
+    """
+    n_hours = len(cost_index["energy"]) - 1
+    first_day, last_day = ci.utc_hour_to_day([cost_index["hour0"], cost_index["hour0"] + n_hours - 1], timezone)
+
+    # Periodgränser som lokala dygnsnummer: start för varje period plus start för perioden efter den sista
+    if freq == "D":
+        start_days = np.arange(first_day, last_day + 2)
+    else:
+        first_date, last_date = np.array([first_day, last_day]).astype("datetime64[D]")
+        periods = pd.period_range(first_date, last_date, freq=freq)
+        start_days = periods.start_time.append(pd.DatetimeIndex([(periods[-1] + 1).start_time]))
+        start_days = start_days.as_unit("s").asi8 // 86_400
+
+    # Dygnsgränserna ligger förberäknade i kalenderindexet (23/24/25-timmarsdygn)
+    boundaries = ci.day_starts_utc(start_days[0], start_days[-1] - 1, timezone)
+    positions = _prefix_positions(cost_index, boundaries[start_days - start_days[0]])
+    energy = np.diff(cost_index["energy"][positions])
+    cost = np.diff(cost_index["cost"][positions])
+    has_data = np.diff(cost_index["count"][positions]) > 0
+
+    df_period = pd.DataFrame({
+        "Date": start_days[:-1][has_data].astype("datetime64[D]").astype(object),
+        "Energy_kWh": energy[has_data],
+        "Cost_SEK": cost[has_data],
+    })
+    return df_period
+
 def calculate_daily_cost(df_merged):
-    """Grupperar per dag och summerar energiförbrukning och elkostnad."""
+    """Summerar energiförbrukning och elkostnad per dag (via prefixsummor, se build_cost_index)."""
 
-    df_daily = df_merged.groupby("Date")[["Energy_kWh", "Cost_SEK"]].sum().reset_index()
+    df_daily = period_summary(build_cost_index(df_merged), "D")
     return df_daily
 
 def export_to_excel(df, excel_file, sheet_name):
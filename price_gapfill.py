@@ -0,0 +1,198 @@
+#
+# Utfyllnad av saknade timpriser så att kostnadsberäkningar inte stannar (eller räknar med 0 kr)
+# när en dag inte kunde hämtas från API:et. Utfyllda timmar markeras som preliminära
+# och kan ersättas med riktiga priser vid en senare körning.
+#
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+import calendar_index as ci
+
+TIMEZONE = ci.TIMEZONE
+FILL_STRATEGIES = ("previous_day", "weekday_profile", "interpolate", "seasonal")
+PREVIOUS_DAY_MAX_DAYS = 31  # hur långt bakåt previous_day letar (räcker för en helt saknad månad)
+
+
+def complete_price_grid(
+    price_df: pd.DataFrame,
+    year: int,
+    month: int,
+    price_column: str = "SE3"
+) -> pd.DataFrame:
+    """
+    Reindexes a price DataFrame onto every local hour of the month, leaving missing hours as NaN.
+    Prices with a finer resolution (e.g. 15-minute prices) are averaged per hour.
+
+    :param price_df: DataFrame with 'DateTime' (tz-aware) and the price column.
+    :param year: Year of interest (e.g., 2025).
+    :param month: Month of interest (1–12).
+    :param price_column: Column name for the electricity price zone (default is 'SE3').
+    :return: DataFrame with 'DateTime', the price column and 'Provisional' (True for missing hours).
+    """
+    # Månadens timmar hämtas ur kalenderindexet (23/25 timmar vid sommar-/vintertid ingår)
+    table = ci.year_table(year, TIMEZONE)
+    utc_hours = table["utc_hour"][table["month"] == month]
+    hours = pd.DatetimeIndex(utc_hours * ci.HOUR_NS, tz="UTC").tz_convert(TIMEZONE)
+
+    # Timpris = medel av timmens priser (fyra kvartspriser per timme)
+    prices = pd.Series(price_df[price_column].to_numpy(dtype=float))
+    prices = prices.groupby(ci.local_to_utc_hour(price_df["DateTime"])).mean()
+
+    df = pd.DataFrame({"DateTime": hours, price_column: prices.reindex(utc_hours).to_numpy()})
+    df["Provisional"] = df[price_column].isna()
+    return df
+
+
+def fill_price_gaps(
+    price_df: pd.DataFrame,
+    price_column: str = "SE3",
+    strategy: str = "previous_day",
+    history: Optional[pd.DataFrame] = None
+) -> pd.DataFrame:
+    """
+    Fills missing hourly prices and flags the filled hours as provisional.
+
+    Strategies:
+        previous_day     – same local hour on the closest earlier day with a price.
+        weekday_profile  – mean price for the same weekday and hour.
+        interpolate      – linear interpolation in time between known prices.
+        seasonal         – least-squares fit of hour-of-day, weekday and trend terms.
+
+    :param price_df: DataFrame with 'DateTime' and the price column, missing hours as NaN (see complete_price_grid).
+    :param price_column: Column name for the electricity price zone (default is 'SE3').
+    :param strategy: One of FILL_STRATEGIES.
+    :param history: Optional DataFrame with earlier cached prices (same columns) used to fit the profile/model.
+    :return: A new DataFrame with the gaps filled, 'Provisional' set for filled hours and 'FillMethod' describing how.
+    """
+    if strategy not in FILL_STRATEGIES:
+        raise ValueError(f"Okänd strategi '{strategy}'. Välj en av {FILL_STRATEGIES}.")
+
+    df = price_df.copy()
+    provisional = df["Provisional"].to_numpy(dtype=bool) if "Provisional" in df else np.zeros(len(df), dtype=bool)
+    missing = df[price_column].isna().to_numpy()
+    df["Provisional"] = provisional | missing
+    previous = df["FillMethod"].fillna("").to_numpy(dtype=object) if "FillMethod" in df else np.full(len(df), "", dtype=object)
+    df["FillMethod"] = np.where(missing, strategy, previous)
+    if not missing.any():
+        return df
+
+    # Kända priser (aktuell period + historik) används som underlag för utfyllnaden
+    known = df.loc[~df["Provisional"], ["DateTime", price_column]]
+    if history is not None and len(history):
+        hist = history[["DateTime", price_column]]
+        if "Provisional" in history:
+            # Filtrera positionellt: historik från flera månader (pd.concat) har upprepade index
+            hist = hist[~history["Provisional"].to_numpy(dtype=bool)]
+        hist = hist.dropna()
+        known = pd.concat([hist, known])
+    known = known.assign(DateTime=pd.to_datetime(known["DateTime"]).dt.tz_convert(TIMEZONE))
+
+    local = pd.to_datetime(df["DateTime"]).dt.tz_convert(TIMEZONE)
+    if strategy == "previous_day":
+        filled = _fill_previous_day(local, known, price_column)
+    elif strategy == "weekday_profile":
+        filled = _fill_weekday_profile(local, known, price_column)
+    elif strategy == "interpolate":
+        filled = _fill_interpolate(local, known, price_column)
+    else:
+        filled = _fill_seasonal(local, known, price_column)
+
+    values = df[price_column].to_numpy(dtype=float, copy=True)
+    values[missing] = filled[missing]
+
+    # Sista utväg om strategin saknade underlag: interpolera/förläng närmaste kända pris
+    still_missing = np.isnan(values)
+    if still_missing.any():
+        values = pd.Series(values).interpolate(limit_direction="both").to_numpy()
+        df.loc[still_missing & missing, "FillMethod"] = "interpolate"
+
+    df[price_column] = values
+    return df
+
+
+def _fill_previous_day(local: pd.Series, known: pd.DataFrame, price_column: str) -> np.ndarray:
+    # Slå upp samma väggklockstimme dag för dag bakåt (högst PREVIOUS_DAY_MAX_DAYS dagar)
+    by_wallclock = known.set_index(known["DateTime"].dt.tz_localize(None))[price_column]
+    by_wallclock = by_wallclock[~by_wallclock.index.duplicated(keep="last")]
+    wallclock = local.dt.tz_localize(None)
+
+    result = np.full(len(local), np.nan)
+    for days_back in range(1, PREVIOUS_DAY_MAX_DAYS + 1):
+        todo = np.isnan(result)
+        if not todo.any():
+            break
+        lookup = wallclock[todo] - pd.Timedelta(days=days_back)
+        result[todo] = by_wallclock.reindex(lookup).to_numpy()
+    return result
+
+
+def _fill_weekday_profile(local: pd.Series, known: pd.DataFrame, price_column: str) -> np.ndarray:
+    profile = known.groupby([known["DateTime"].dt.weekday, known["DateTime"].dt.hour])[price_column].mean()
+    index = pd.MultiIndex.from_arrays([local.dt.weekday, local.dt.hour])
+    return profile.reindex(index).to_numpy()
+
+
+def _epoch_ns(times: pd.Series) -> np.ndarray:
+    return times.dt.tz_convert("UTC").dt.as_unit("ns").astype("int64").to_numpy()
+
+
+def _fill_interpolate(local: pd.Series, known: pd.DataFrame, price_column: str) -> np.ndarray:
+    if known.empty:
+        return np.full(len(local), np.nan)
+    known = known.sort_values("DateTime")
+    x_known = _epoch_ns(known["DateTime"])
+    x = _epoch_ns(local)
+    return np.interp(x, x_known, known[price_column].to_numpy(dtype=float))
+
+
+def _seasonal_design(times: pd.Series, t0: int) -> np.ndarray:
+    # Kolumner: 24 timdummies, 6 veckodagsdummies (måndag som referens) och linjär trend i dagar
+    hours = times.dt.hour.to_numpy()
+    weekdays = times.dt.weekday.to_numpy()
+    days = (_epoch_ns(times) - t0) / 86_400e9
+    X = np.zeros((len(times), 24 + 6 + 1))
+    X[np.arange(len(times)), hours] = 1.0
+    has_weekday = weekdays > 0
+    X[np.flatnonzero(has_weekday), 24 + weekdays[has_weekday] - 1] = 1.0
+    X[:, -1] = days
+    return X
+
+
+def _fill_seasonal(local: pd.Series, known: pd.DataFrame, price_column: str) -> np.ndarray:
+    if len(known) < 48:
+        # För lite historik för att skatta modellen
+        return _fill_weekday_profile(local, known, price_column)
+    t0 = int(_epoch_ns(known["DateTime"]).min())
+    X = _seasonal_design(known["DateTime"], t0)
+    coef, *_ = np.linalg.lstsq(X, known[price_column].to_numpy(dtype=float), rcond=None)
+    return _seasonal_design(local, t0) @ coef
+
+
+def merge_final_prices(
+    price_df: pd.DataFrame,
+    new_price_df: pd.DataFrame,
+    price_column: str = "SE3"
+) -> pd.DataFrame:
+    """
+    Replaces provisional (filled) hours with real prices from a later fetch.
+
+    :param price_df: Earlier, gap-filled DataFrame with 'DateTime', the price column and 'Provisional'.
+    :param new_price_df: Newly fetched DataFrame with 'DateTime' and the price column.
+    :param price_column: Column name for the electricity price zone (default is 'SE3').
+    :return: A new DataFrame where every hour with a real price is marked final.
+    """
+    df = price_df.copy()
+    fresh = new_price_df.dropna(subset=[price_column])
+    if "Provisional" in fresh:
+        fresh = fresh[~fresh["Provisional"].astype(bool)]
+    fresh_prices = fresh.set_index(pd.to_datetime(fresh["DateTime"]))[price_column]
+    fresh_prices = fresh_prices[~fresh_prices.index.duplicated(keep="last")]
+
+    update = fresh_prices.reindex(pd.to_datetime(df["DateTime"])).to_numpy()
+    replace = df["Provisional"].to_numpy(dtype=bool) & ~np.isnan(update)
+    df.loc[replace, price_column] = update[replace]
+    df.loc[replace, "Provisional"] = False
+    if "FillMethod" in df:
+        df.loc[replace, "FillMethod"] = ""
+    return df
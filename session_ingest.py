@@ -0,0 +1,183 @@
+#
+# Snabb inläsning av laddsessioner från Excel-filer (en arbetsbok per laddplats).
+# Läser endast kolumnerna Start, End och Consumption i openpyxl:s read-only-läge
+# och cachar resultatet per fil så att oförändrade arbetsböcker aldrig tolkas om.
+#
+import os
+import pickle
+import hashlib
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import load_workbook
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+SESSION_COLUMNS = ("Start", "End", "Consumption")
+DEFAULT_CACHE_DIR = ".session_cache"
+
+
+def read_session_columns(
+    file_path: str,
+    sheet_name: str = "InputData",
+    columns: Sequence[str] = SESSION_COLUMNS
+) -> pd.DataFrame:
+    """
+    Reads only the requested columns from one worksheet using openpyxl in read-only (streaming) mode.
+
+    :param file_path: Path to the Excel file.
+    :param sheet_name: Name of the worksheet to read from (default is "InputData").
+    :param columns: Column headers to extract (default is Start, End, Consumption).
+    :return: DataFrame with the requested columns, Start/End as datetime and Consumption as float.
+    """
+    wb = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        ws = wb[sheet_name]
+        rows = ws.iter_rows(values_only=True)
+
+        # Första raden innehåller kolumnrubrikerna
+        header = next(rows, None)
+        if header is None:
+            raise ValueError(f"Fliken '{sheet_name}' i {file_path} är tom.")
+
+        positions = []
+        for column in columns:
+            if column not in header:
+                raise ValueError(f"Kolumnen '{column}' saknas i fliken '{sheet_name}' i {file_path}.")
+            positions.append(header.index(column))
+
+        # Plocka bara ut de celler vi behöver, hoppa över helt tomma rader
+        data = {column: [] for column in columns}
+        for row in rows:
+            values = [row[pos] if pos < len(row) else None for pos in positions]
+            if all(value is None for value in values):
+                continue
+            for column, value in zip(columns, values):
+                data[column].append(value)
+    finally:
+        wb.close()
+
+    df = pd.DataFrame(data, columns=list(columns))
+    for column in ("Start", "End"):
+        if column in df:
+            df[column] = pd.to_datetime(df[column])
+    if "Consumption" in df:
+        df["Consumption"] = df["Consumption"].astype(float)
+    return df
+
+
+def file_fingerprint(file_path: str) -> str:
+    """
+    Returns a fingerprint of a file based on its size and content hash.
+
+    :param file_path: Path to the file.
+    :return: Hex digest identifying this exact version of the file.
+    """
+    digest = hashlib.sha1()
+    digest.update(f"{os.path.getsize(file_path)}:".encode())
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_path(cache_dir: str, file_path: str, sheet_name: str) -> str:
+    name = hashlib.sha1(f"{os.path.abspath(file_path)}|{sheet_name}".encode()).hexdigest()
+    return os.path.join(cache_dir, f"{name}.pkl")
+
+
+def load_session_sheet_cached(
+    file_path: str,
+    sheet_name: str = "InputData",
+    cache_dir: Optional[str] = DEFAULT_CACHE_DIR
+) -> pd.DataFrame:
+    """
+    Reads the session columns from one worksheet, reusing a cached result if the file is unchanged.
+
+    :param file_path: Path to the Excel file.
+    :param sheet_name: Name of the worksheet to read from (default is "InputData").
+    :param cache_dir: Directory for cached results, or None to disable caching.
+    :return: DataFrame with columns 'Start', 'End' and 'Consumption'.
+    """
+    if cache_dir is None:
+        return read_session_columns(file_path, sheet_name)
+
+    cache_file = _cache_path(cache_dir, file_path, sheet_name)
+
+    # Snabbkontroll: storlek och mtime oförändrade -> använd cachen direkt utan att hasha filen
+    stat = os.stat(file_path)
+    quick_key = (stat.st_size, stat.st_mtime_ns)
+    fingerprint = None
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, "rb") as f:
+                cached = pickle.load(f)
+            if cached["quick_key"] == quick_key:
+                return cached["data"]
+            # mtime ändrad men innehållet kan vara detsamma (t.ex. kopierad fil)
+            fingerprint = file_fingerprint(file_path)
+            if cached["fingerprint"] == fingerprint:
+                cached["quick_key"] = quick_key
+                _write_cache(cache_file, cached)
+                return cached["data"]
+        except Exception as e:
+            print(f"Kunde inte läsa cache för {file_path}: {e}")
+
+    df = read_session_columns(file_path, sheet_name)
+    if fingerprint is None:
+        fingerprint = file_fingerprint(file_path)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_cache(cache_file, {"quick_key": quick_key, "fingerprint": fingerprint, "data": df})
+    return df
+
+
+def _write_cache(cache_file: str, entry: dict) -> None:
+    # Skriv till temporär fil först så att en avbruten körning aldrig lämnar en trasig cache
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "wb") as f:
+        pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, cache_file)
+
+
+def _load_job(job: Tuple[str, str, Optional[str]]) -> pd.DataFrame:
+    file_path, sheet_name, cache_dir = job
+    return load_session_sheet_cached(file_path, sheet_name, cache_dir)
+
+
+def load_sessions_from_workbooks(
+    file_paths: Iterable[str],
+    sheet_names: Sequence[str] = ("InputData",),
+    cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+    max_workers: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Reads charging sessions from many workbooks/sheets in a process pool and concatenates them.
+
+    :param file_paths: Paths to the Excel files (typically one workbook per charging site).
+    :param sheet_names: Worksheets to read from each workbook (default is only "InputData").
+    :param cache_dir: Directory for cached results, or None to disable caching.
+    :param max_workers: Number of worker processes (default is the number of CPUs). Use 1 to read serially.
+    :return: DataFrame with columns 'Site', 'Sheet', 'Start', 'End' and 'Consumption'.
+    """
+    jobs: List[Tuple[str, str, Optional[str]]] = [
+        (file_path, sheet_name, cache_dir)
+        for file_path in file_paths
+        for sheet_name in sheet_names
+    ]
+    if not jobs:
+        return pd.DataFrame(columns=["Site", "Sheet", *SESSION_COLUMNS])
+
+    if max_workers == 1 or len(jobs) == 1:
+        frames = [_load_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            frames = list(executor.map(_load_job, jobs))
+
+    # Märk varje session med vilken arbetsbok (laddplats) och flik den kommer från
+    labelled = []
+    for (file_path, sheet_name, _), df in zip(jobs, frames):
+        df = df.copy()
+        df.insert(0, "Sheet", sheet_name)
+        df.insert(0, "Site", os.path.splitext(os.path.basename(file_path))[0])
+        labelled.append(df)
+
+    return pd.concat(labelled, ignore_index=True)
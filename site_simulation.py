@@ -0,0 +1,214 @@
+#
+# Monte Carlo-simulering av laddplatser för kapacitetsplanering.
+# Genererar syntetiska laddsessioner för en hypotetisk bilflotta (antal bilar, ankomst-/avresetider,
+# energibehov), kostnadsberäknar dem mot historiska timpriser med den vektoriserade timuppdelningen
+# från disaggregation.py och ger fördelningar för platsens toppeffekt och totalkostnad.
+# Scenarier körs parallellt över processorkärnor med reproducerbara slumpfrön.
+#
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import calendar_index as ci
+from disaggregation import expand_hours_ns
+
+DEFAULT_SCENARIO = {
+    "n_cars": 10,               # antal bilar som använder platsen
+    "days": 365,                # antal dygn per simulerat platsår
+    "charge_probability": 0.7,  # sannolikhet att en bil laddar ett visst dygn
+    "arrival_mean_hour": 17.5,  # medelankomsttid (timme, lokal tid)
+    "arrival_std_hours": 2.0,
+    "dwell_mean_hours": 12.0,   # medeltid bilen står inkopplad
+    "dwell_std_hours": 3.0,
+    "kwh_mean": 15.0,           # medelenergibehov per laddning
+    "kwh_std": 6.0,
+    "battery_kwh": 75.0,        # största möjliga energibehov per laddning
+    "charger_kw": 11.0,         # laddeffekt per laddpunkt
+}
+
+
+def prepare_price_array(
+    price_df: pd.DataFrame,
+    price_column: str = "SE3"
+) -> Tuple[int, np.ndarray]:
+    """
+    Converts an hourly price DataFrame to a contiguous array over local wall-clock hours.
+
+    :param price_df: DataFrame with 'DateTime' (tz-aware) and the price column, e.g. several years of cached prices.
+    :param price_column: Column name for the electricity price zone (default is 'SE3').
+    :return: Tuple of (first local hour as hours since 1970-01-01, price per local hour in SEK/kWh).
+    """
+    hours = ci.utc_to_wallclock_hour(ci.local_to_utc_hour(price_df["DateTime"]))
+    hour0 = int(hours.min())
+    positions = hours - hour0
+
+    # Dubbla timmar (vintertid) medelvärdesbildas, saknade timmar (sommartid, luckor) fylls framåt
+    n_hours = int(positions.max()) + 1
+    total = np.bincount(positions, weights=price_df[price_column].to_numpy(dtype=float), minlength=n_hours)
+    count = np.bincount(positions, minlength=n_hours)
+    prices = pd.Series(np.where(count > 0, total / np.maximum(count, 1), np.nan)).ffill().bfill()
+    return hour0, prices.to_numpy()
+
+
+def generate_sessions(
+    rng: np.random.Generator,
+    scenario: Dict,
+    first_day_hour: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Draws one synthetic batch of charging sessions for a simulated site-year.
+
+    :param rng: Random generator for this run.
+    :param scenario: Scenario parameters (see DEFAULT_SCENARIO).
+    :param first_day_hour: Local midnight of the first simulated day, as hours since 1970-01-01.
+    :return: Tuple of (start ns, end ns, kWh) arrays in local wall-clock time.
+    """
+    n_cars, days = scenario["n_cars"], scenario["days"]
+    charges = rng.random((days, n_cars)) < scenario["charge_probability"]
+    day_idx = np.nonzero(charges)[0]
+    n = len(day_idx)
+
+    arrival = rng.normal(scenario["arrival_mean_hour"], scenario["arrival_std_hours"], n) % 24
+
+    # Lognormalfördelad inkopplingstid med angivet medelvärde och standardavvikelse
+    mean, std = scenario["dwell_mean_hours"], scenario["dwell_std_hours"]
+    sigma2 = np.log1p((std / mean) ** 2)
+    dwell = rng.lognormal(np.log(mean) - sigma2 / 2, np.sqrt(sigma2), n)
+
+    demand = np.clip(rng.normal(scenario["kwh_mean"], scenario["kwh_std"], n), 0.5, scenario["battery_kwh"])
+
+    # Bilen laddar med full effekt direkt vid ankomst tills behovet är täckt eller den åker
+    energy = np.minimum(demand, scenario["charger_kw"] * dwell)
+    start_hours = first_day_hour + day_idx * 24 + arrival
+    charge_hours = energy / scenario["charger_kw"]
+
+    start_ns = (start_hours * ci.HOUR_NS).astype(np.int64)
+    end_ns = start_ns + (charge_hours * ci.HOUR_NS).astype(np.int64)
+    return start_ns, end_ns, energy
+
+
+def peak_concurrent_kw(start_ns: np.ndarray, end_ns: np.ndarray, charger_kw: float) -> float:
+    """
+    Returns the highest simultaneous charging load, sweeping over session start and end events.
+
+    :param start_ns: Session start times as int64 nanoseconds.
+    :param end_ns: Session end times as int64 nanoseconds.
+    :param charger_kw: Charging power per session (kW).
+    :return: Peak load in kW.
+    """
+    valid = end_ns > start_ns
+    if not valid.any():
+        return 0.0
+    times = np.concatenate([start_ns[valid], end_ns[valid]])
+    steps = np.concatenate([np.full(valid.sum(), charger_kw), np.full(valid.sum(), -charger_kw)])
+
+    # Sortera på tid och lägg avslut före start vid samma tidpunkt (en bil som kopplas ur
+    # samtidigt som nästa kopplas in ger ingen extra topp)
+    order = np.lexsort((steps, times))
+    return float(np.cumsum(steps[order]).max())
+
+
+def simulate_site_year(
+    rng: np.random.Generator,
+    scenario: Dict,
+    hour0: int,
+    prices: np.ndarray
+) -> Dict[str, float]:
+    """
+    Simulates one site-year against a randomly chosen window of the historical prices.
+
+    :param rng: Random generator for this run.
+    :param scenario: Scenario parameters (see DEFAULT_SCENARIO).
+    :param hour0: First local hour of the price array (see prepare_price_array).
+    :param prices: Price per local hour (see prepare_price_array).
+    :return: Dictionary with 'Peak_kW' (highest concurrent charging load), 'Peak_hour_kWh' (highest
+             hourly energy), 'Energy_kWh', 'Cost_SEK' and 'Avg_price_SEK_per_kWh'.
+    """
+    # Välj ett startdygn så att hela perioden (plus marginal för sessioner över midnatt) har priser
+    first_midnight = -(-hour0 // 24) * 24
+    n_days_available = (hour0 + len(prices) - first_midnight) // 24 - scenario["days"] - 2
+    if n_days_available < 0:
+        raise ValueError("Prishistoriken är kortare än den simulerade perioden.")
+    first_day_hour = first_midnight + 24 * int(rng.integers(0, n_days_available + 1))
+
+    start_ns, end_ns, energy = generate_sessions(rng, scenario, first_day_hour)
+    _, hour_ns, kwh = expand_hours_ns(start_ns, end_ns, energy)
+
+    # Platsens energi per timme (timmedeleffekt, jämnar ut korta toppar)
+    positions = hour_ns // ci.HOUR_NS - first_day_hour
+    hourly = np.bincount(positions, weights=kwh)
+    cost = float(np.dot(kwh, prices[positions + (first_day_hour - hour0)]))
+    total_energy = float(energy.sum())
+
+    return {
+        "Peak_kW": peak_concurrent_kw(start_ns, end_ns, scenario["charger_kw"]),
+        "Peak_hour_kWh": float(hourly.max()) if len(hourly) else 0.0,
+        "Energy_kWh": total_energy,
+        "Cost_SEK": cost,
+        "Avg_price_SEK_per_kWh": cost / total_energy if total_energy else float("nan"),
+    }
+
+
+def _run_batch(job) -> List[Dict[str, float]]:
+    scenario, hour0, prices, seeds = job
+    results = []
+    for seed in seeds:
+        rng = np.random.default_rng(seed)
+        results.append(simulate_site_year(rng, scenario, hour0, prices))
+    return results
+
+
+def run_scenario(
+    price_df: pd.DataFrame,
+    scenario: Optional[Dict] = None,
+    n_runs: int = 1000,
+    seed: int = 0,
+    price_column: str = "SE3",
+    max_workers: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Runs a Monte Carlo simulation of a charging site, one row per simulated site-year.
+
+    :param price_df: DataFrame with historical hourly prices ('DateTime' and the price column).
+    :param scenario: Scenario parameters overriding DEFAULT_SCENARIO.
+    :param n_runs: Number of simulated site-years.
+    :param seed: Seed for the run; the same seed gives the same result regardless of max_workers.
+    :param price_column: Column name for the electricity price zone (default is 'SE3').
+    :param max_workers: Number of worker processes (default is the number of CPUs). Use 1 to run serially.
+    :return: DataFrame with 'Run', 'Peak_kW', 'Peak_hour_kWh', 'Energy_kWh', 'Cost_SEK' and 'Avg_price_SEK_per_kWh'.
+    """
+    scenario = {**DEFAULT_SCENARIO, **(scenario or {})}
+    hour0, prices = prepare_price_array(price_df, price_column)
+
+    # Ett oberoende slumpfrö per körning, så att resultatet inte beror på hur körningarna fördelas
+    seeds = np.random.SeedSequence(seed).spawn(n_runs)
+
+    if max_workers == 1:
+        results = _run_batch((scenario, hour0, prices, seeds))
+    else:
+        # Dela upp körningarna i några batcher per process så att prisarrayen inte skickas per körning
+        n_batches = min(n_runs, 4 * (max_workers or os.cpu_count() or 1))
+        chunk = -(-n_runs // n_batches)
+        jobs = [(scenario, hour0, prices, seeds[i:i + chunk]) for i in range(0, n_runs, chunk)]
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = [result for batch in executor.map(_run_batch, jobs) for result in batch]
+
+    df = pd.DataFrame(results)
+    df.insert(0, "Run", np.arange(len(df)))
+    return df
+
+
+def summarize_runs(df_runs: pd.DataFrame, quantiles=(0.05, 0.5, 0.95)) -> pd.DataFrame:
+    """
+    Summarizes the distributions of peak load and cost over the simulated site-years.
+
+    :param df_runs: Result from run_scenario.
+    :param quantiles: Quantiles to report.
+    :return: DataFrame with mean and the requested quantiles for each result column.
+    """
+    columns = ["Peak_kW", "Peak_hour_kWh", "Energy_kWh", "Cost_SEK", "Avg_price_SEK_per_kWh"]
+    summary = df_runs[columns].quantile(list(quantiles))
+    summary.index = [f"p{int(q * 100)}" for q in quantiles]
+    return pd.concat([df_runs[columns].mean().to_frame("mean").T, summary])
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import calendar_index as ci
+import charging_costs as cc
+import disaggregation as dg
+
+
+def _utc_hours(times, **kwargs):
+    return ci.local_to_utc_hour(pd.to_datetime(pd.Series(times)), **kwargs)
+
+
+@pytest.mark.parametrize("year, n_hours", [(2024, 8784), (2025, 8760)])
+def test_year_has_every_real_hour(year, n_hours):
+    table = ci.year_table(year)
+    assert len(table["utc_hour"]) == n_hours
+    assert (np.diff(table["utc_hour"]) == 1).all()
+    assert table["day_length"].sum() == n_hours
+
+
+def test_dst_day_lengths():
+    table = ci.year_table(2025)
+    days = np.arange(len(table["day_length"])) + table["day"][0]
+    lengths = dict(zip(days.astype("datetime64[D]").astype(str), table["day_length"]))
+    assert lengths["2025-03-30"] == 23
+    assert lengths["2025-10-26"] == 25
+    assert sorted(set(table["day_length"])) == [23, 24, 25]
+    assert (table["day_length"] == 24).sum() == 365 - 2
+
+
+def test_repeated_october_hour_sequential():
+    times = ["2025-10-26 01:00", "2025-10-26 02:00", "2025-10-26 02:00", "2025-10-26 03:00"]
+    utc = _utc_hours(times, sequential=True)
+    assert list(np.diff(utc)) == [1, 1, 1]
+
+    # Utan sequential ger den dubbla timmen första förekomsten båda gångerna
+    utc = _utc_hours(times)
+    assert utc[1] == utc[2]
+
+
+def test_sequential_ignores_duplicate_of_normal_hour():
+    # En dubblerad rad en vanlig timme är inte en dubbel timme och ska inte flyttas
+    utc = _utc_hours(["2025-10-27 05:00", "2025-10-27 05:00"], sequential=True)
+    assert utc[0] == utc[1]
+
+
+def test_nonexistent_spring_hour():
+    utc = _utc_hours(["2025-03-30 01:00", "2025-03-30 02:00", "2025-03-30 03:00"])
+    assert utc[1] == utc[2] == utc[0] + 1
+
+
+def test_round_trip_over_year_boundary():
+    # UTC-timmarna runt årsskiftet hör till olika lokala år än sina UTC-datum
+    first = ci.year_table(2025)["utc_hour"][0]
+    utc = np.arange(first - 48, first + 48)
+    wallclock = ci.utc_to_wallclock_hour(utc)
+    assert (np.diff(wallclock) == 1).all()
+    np.testing.assert_array_equal(ci.wallclock_to_utc_hour(wallclock, sequential=True), utc)
+
+    days = ci.utc_hour_to_day(utc).astype("datetime64[D]").astype(str)
+    assert days[47] == "2024-12-31"
+    assert days[48] == "2025-01-01"
+    assert ci.utc_hour_to_timestamp(first) == pd.Timestamp("2025-01-01 00:00", tz=ci.TIMEZONE)
+
+
+def test_day_starts_over_year_boundary():
+    first_day = int(np.datetime64("2024-12-30", "D").astype(np.int64))
+    starts = ci.day_starts_utc(first_day, first_day + 3)
+    assert list(np.diff(starts)) == [24, 24, 24, 24]
+    assert starts[2] == ci.year_table(2025)["utc_hour"][0]
+
+
+@pytest.mark.parametrize("start, end, hours", [
+    ("2025-03-30 01:30", "2025-03-30 04:00", 1.5),
+    ("2025-10-26 01:30", "2025-10-26 04:00", 3.5),
+    ("2025-06-01 01:30", "2025-06-01 04:00", 2.5),
+])
+def test_sessions_split_over_real_hours(start, end, hours):
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    start_ns, end_ns = ci.local_to_utc_ns([start, end])
+    assert (end_ns - start_ns) / ci.HOUR_NS == hours
+
+    # 1 kWh per verklig timme
+    _, hour_ns, kwh = dg.expand_sessions_hourly([start], [end], [hours])
+    assert kwh.sum() == pytest.approx(hours)
+    assert len(np.unique(hour_ns)) == len(hour_ns)
+    assert kwh.max() == pytest.approx(1.0)
+
+    keys = cc._session_hours(start, end)
+    price_data = {key: 1.0 for key in keys}
+    assert len(keys) == len(hour_ns)
+    assert cc.calculate_charging_cost(start, end, hours, price_data) == pytest.approx(hours)
+
+
+def test_tariff_band():
+    utc = _utc_hours(["2025-01-10 06:00", "2025-01-10 05:00", "2025-01-10 22:00",
+                      "2025-01-11 12:00", "2025-06-10 12:00"])
+    assert list(ci.tariff_band(utc)) == [ci.TARIFF_HIGH, ci.TARIFF_LOW, ci.TARIFF_LOW, ci.TARIFF_LOW, ci.TARIFF_LOW]
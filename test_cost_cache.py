@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import calendar_index as ci
+import charging_costs as cc
+import cost_cache
+
+
+@pytest.fixture
+def prices():
+    table = ci.year_table(2025)
+    hours = pd.DatetimeIndex(table["utc_hour"][table["month"] == 3] * ci.HOUR_NS, tz="UTC").tz_convert(ci.TIMEZONE)
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"DateTime": hours, "SE3": rng.uniform(0.1, 2.0, len(hours)), "Provisional": False})
+    df.loc[100:110, "Provisional"] = True
+    return df
+
+
+@pytest.fixture
+def sessions():
+    rng = np.random.default_rng(1)
+    starts = pd.Timestamp("2025-03-01") + pd.to_timedelta(rng.integers(0, 27 * 24 * 60, 200), unit="min")
+    return pd.DataFrame({
+        "Start": starts,
+        "End": starts + pd.to_timedelta(rng.integers(30, 14 * 60, 200), unit="min"),
+        "Consumption": rng.uniform(1.0, 30.0, 200),
+    })
+
+
+@pytest.fixture
+def count_calls(monkeypatch):
+    calls = []
+    calculate = cc.calculate_charging_cost
+
+    def counting(*args, **kwargs):
+        calls.append(args[:2])
+        return calculate(*args, **kwargs)
+
+    monkeypatch.setattr(cc, "calculate_charging_cost", counting)
+    return calls
+
+
+def test_rerun_recalculates_only_new_sessions(tmp_path, prices, sessions, count_calls):
+    cache_file = str(tmp_path / "costs.pkl")
+    df_expected = cc.calculate_all_charging_costs(sessions, prices)
+    count_calls.clear()
+
+    df_first = cc.calculate_all_charging_costs(sessions, prices, cache_file=cache_file)
+    assert len(count_calls) == len(sessions)
+
+    # Samma sessioner plus en ny: bara den nya räknas om
+    extra = sessions.iloc[:1].assign(Consumption=99.0)
+    df_more = pd.concat([sessions, extra], ignore_index=True)
+    df_before = df_more.copy()
+    count_calls.clear()
+    df_second = cc.calculate_all_charging_costs(df_more, prices, cache_file=cache_file)
+
+    assert len(count_calls) == 1
+    pd.testing.assert_frame_equal(df_more, df_before)
+    assert "ChargingCost" not in df_more
+    np.testing.assert_allclose(df_first["ChargingCost"], df_expected["ChargingCost"])
+    np.testing.assert_allclose(df_second["ChargingCost"].iloc[:-1], df_expected["ChargingCost"])
+    assert list(df_second["PriceStatus"].iloc[:-1]) == list(df_expected["PriceStatus"])
+
+
+def test_price_change_recalculates_sessions_on_that_day(tmp_path, prices, sessions, count_calls):
+    cache_file = str(tmp_path / "costs.pkl")
+    cc.calculate_all_charging_costs(sessions, prices, cache_file=cache_file)
+
+    changed = prices.copy()
+    changed.loc[200, "SE3"] += 1.0
+    day = ci.utc_hour_to_day(ci.local_to_utc_hour(changed["DateTime"].iloc[[200]]))[0]
+    first_days, last_days = cost_cache.session_days(sessions["Start"], sessions["End"])
+    affected = int(((first_days <= day) & (last_days >= day)).sum())
+
+    count_calls.clear()
+    df_result = cc.calculate_all_charging_costs(sessions, changed, cache_file=cache_file)
+    assert 0 < len(count_calls) == affected
+    np.testing.assert_allclose(df_result["ChargingCost"], cc.calculate_all_charging_costs(sessions, changed)["ChargingCost"])
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache_file = str(tmp_path / "costs.pkl")
+    cache = cost_cache.load_cost_cache(cache_file)
+    for key in "abcd":
+        cache[key] = (1.0, None)
+    cache.move_to_end("a")
+    cost_cache.save_cost_cache(cache, cache_file, max_entries=2)
+    assert list(cost_cache.load_cost_cache(cache_file)) == ["d", "a"]
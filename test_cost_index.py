@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import energy_cost as ec
+
+CSV_FILES = ["konsumtion2501.csv", "konsumtion2502.csv", "konsumtion2503.csv"]
+
+
+def _merged(csv_file):
+    # Syntetiska timpriser (ingen nätverksåtkomst) på samma UTC-timmar som mätarserien
+    df_energy = ec.load_energy_data(csv_file)
+    rng = np.random.default_rng(0)
+    df_prices = pd.DataFrame({
+        "Datetime": df_energy["Datetime"],
+        "Price_SEK_per_kWh": rng.uniform(0.05, 3.0, len(df_energy)),
+        "UTC_Hour": df_energy["UTC_Hour"],
+    })
+    return df_energy, df_prices
+
+
+def _groupby_daily(df_merged):
+    # Den tidigare implementationen av calculate_daily_cost
+    return df_merged.groupby("Date")[["Energy_kWh", "Cost_SEK"]].sum().reset_index()
+
+
+def _assert_same(df_daily, df_expected):
+    assert list(df_daily["Date"]) == list(df_expected["Date"])
+    np.testing.assert_allclose(df_daily["Energy_kWh"], df_expected["Energy_kWh"], rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(df_daily["Cost_SEK"], df_expected["Cost_SEK"], rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("csv_file", CSV_FILES)
+def test_daily_cost_matches_groupby(csv_file):
+    df_energy, df_prices = _merged(csv_file)
+    df_merged = ec.merge_energy_prices(df_energy, df_prices)
+    _assert_same(ec.calculate_daily_cost(df_merged), _groupby_daily(df_merged))
+
+
+@pytest.mark.parametrize("csv_file", CSV_FILES)
+def test_daily_cost_with_missing_day(csv_file):
+    df_energy, df_prices = _merged(csv_file)
+    # Priser saknas för en hel dag mitt i månaden, så dagen faller bort i merge
+    missing_day = sorted(df_energy["Date"].unique())[10]
+    df_prices = df_prices[(df_energy["Date"] != missing_day).to_numpy()]
+    df_merged = ec.merge_energy_prices(df_energy, df_prices)
+
+    df_daily = ec.calculate_daily_cost(df_merged)
+    assert missing_day not in set(df_daily["Date"])
+    assert len(df_daily) == df_energy["Date"].nunique() - 1
+    _assert_same(df_daily, _groupby_daily(df_merged))
+
+
+@pytest.mark.parametrize("csv_file", CSV_FILES)
+def test_daily_cost_with_nan(csv_file):
+    df_energy, df_prices = _merged(csv_file)
+    df_merged = ec.merge_energy_prices(df_energy, df_prices)
+    df_merged.loc[5, "Energy_kWh"] = np.nan
+    df_merged.loc[5, "Cost_SEK"] = np.nan
+    df_merged.loc[300, "Cost_SEK"] = np.nan
+
+    df_daily = ec.calculate_daily_cost(df_merged)
+    assert not df_daily[["Energy_kWh", "Cost_SEK"]].isna().any().any()
+    _assert_same(df_daily, _groupby_daily(df_merged))
+
+
+def test_range_summary_after_nan():
+    df_energy, df_prices = _merged(CSV_FILES[0])
+    df_merged = ec.merge_energy_prices(df_energy, df_prices)
+    df_merged.loc[0, "Cost_SEK"] = np.nan
+
+    cost_index = ec.build_cost_index(df_merged)
+    summary = ec.range_summary(cost_index, pd.Timestamp("2025-01-10"), pd.Timestamp("2025-01-11"))
+    day = df_merged[df_merged["Date"] == pd.Timestamp("2025-01-10").date()]
+    assert summary["Energy_kWh"] == pytest.approx(day["Energy_kWh"].sum())
+    assert summary["Cost_SEK"] == pytest.approx(day["Cost_SEK"].sum())
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+def test_merge_quarter_hour_prices(monkeypatch):
+    # API:et levererar 96 kvartspriser per dygn; varje mätartimme ska matcha en rad med timmens medelpris
+    def fake_get(url):
+        starts = pd.date_range("2025-01-10", periods=96, freq="15min", tz=ec.ci.TIMEZONE)
+        return _Response([
+            {"time_start": start.isoformat(), "SEK_per_kWh": float(i % 4)}
+            for i, start in enumerate(starts)
+        ])
+
+    monkeypatch.setattr(ec.requests, "get", fake_get)
+    df_energy = ec.load_energy_data(CSV_FILES[0])
+    df_energy = df_energy[df_energy["Date"] == pd.Timestamp("2025-01-10").date()]
+    df_prices = ec.fetch_prices_for_dates(["2025-01-10"])
+    df_merged = ec.merge_energy_prices(df_energy, df_prices)
+
+    assert len(df_prices) == 96
+    assert len(df_merged) == 24
+    np.testing.assert_allclose(df_merged["Price_SEK_per_kWh"], 1.5)
+    assert df_merged["Energy_kWh"].sum() == pytest.approx(df_energy["Energy_kWh"].sum())
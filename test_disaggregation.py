@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import disaggregation as dg
+import energy_cost as ec
+
+
+@pytest.fixture
+def df_energy():
+    df = ec.load_energy_data("konsumtion2501.csv")
+    df["Price_SEK_per_kWh"] = 1.0 + (df["Datetime"].dt.hour.to_numpy() >= 17)
+    df["Cost_SEK"] = df["Energy_kWh"] * df["Price_SEK_per_kWh"]
+    return df
+
+
+def _hour(df, text):
+    return df.index[df["Datetime"] == pd.Timestamp(text)][0]
+
+
+def test_ev_capped_at_meter(df_energy):
+    # 30 kWh på en timme är mer än mätaren registrerade
+    df_sessions = pd.DataFrame({
+        "Start": pd.to_datetime(["2025-01-10 18:00", "2025-01-12 01:00"]),
+        "End": pd.to_datetime(["2025-01-10 19:00", "2025-01-12 03:00"]),
+        "Consumption": [30.0, 1.0],
+    })
+    df = dg.disaggregate_household_ev(df_energy, df_sessions)
+
+    over = _hour(df, "2025-01-10 18:00")
+    metered = df.loc[over, "Energy_kWh"]
+    assert df.loc[over, "EV_kWh"] == pytest.approx(metered)
+    assert df.loc[over, "EV_Excess_kWh"] == pytest.approx(30.0 - metered)
+    assert df.loc[over, "Household_kWh"] == 0
+    assert df.loc[over, "EV_Exceeds_Meter"]
+
+    night = [_hour(df, "2025-01-12 01:00"), _hour(df, "2025-01-12 02:00")]
+    np.testing.assert_allclose(df.loc[night, "EV_kWh"], 0.5)
+    assert not df.loc[night, "EV_Exceeds_Meter"].any()
+    assert df["EV_Exceeds_Meter"].sum() == 1
+
+    # Uppdelningen summerar alltid till mätvärdet och den mätta kostnaden
+    np.testing.assert_allclose(df["EV_kWh"] + df["Household_kWh"], df["Energy_kWh"].clip(lower=0))
+    np.testing.assert_allclose(df["EV_Cost_SEK"] + df["Household_Cost_SEK"], df["Cost_SEK"])
+    assert df["EV_kWh"].sum() + df["EV_Excess_kWh"].sum() == pytest.approx(31.0)
+
+
+def test_daily_disaggregation(df_energy):
+    df_sessions = pd.DataFrame({
+        "Start": pd.to_datetime(["2025-01-10 18:00"]),
+        "End": pd.to_datetime(["2025-01-10 19:00"]),
+        "Consumption": [30.0],
+    })
+    df_daily = dg.daily_disaggregation(dg.disaggregate_household_ev(df_energy, df_sessions))
+    day = df_daily[df_daily["Date"] == pd.Timestamp("2025-01-10").date()].iloc[0]
+    assert day["EV_Exceeds_Hours"] == 1
+    assert day["EV_kWh"] + day["EV_Excess_kWh"] == pytest.approx(30.0)
+    # Fredag kl. 18 i januari är höglasttid
+    assert day["EV_HighLoad_kWh"] == pytest.approx(day["EV_kWh"])
+    assert df_daily["EV_HighLoad_kWh"].sum() == pytest.approx(day["EV_kWh"])
+    assert len(df_daily) == 31
+
+
+def test_night_charging_is_low_load(df_energy):
+    df_sessions = pd.DataFrame({
+        "Start": pd.to_datetime(["2025-01-14 01:00"]),
+        "End": pd.to_datetime(["2025-01-14 04:00"]),
+        "Consumption": [1.5],
+    })
+    df_daily = dg.daily_disaggregation(dg.disaggregate_household_ev(df_energy, df_sessions))
+    assert df_daily["EV_kWh"].sum() == pytest.approx(1.5)
+    assert df_daily["EV_HighLoad_kWh"].sum() == 0
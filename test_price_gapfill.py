@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import calendar_index as ci
+import charging_costs as cc
+import price_gapfill as pg
+
+
+def _month_prices(year, month, freq="h", seed=0):
+    # Syntetiska priser för alla timmar (eller kvartar) i månaden, med dygnsprofil
+    start = pd.Timestamp(year=year, month=month, day=1, tz=ci.TIMEZONE)
+    times = pd.date_range(start, start + pd.offsets.MonthBegin(1), freq=freq, inclusive="left")
+    rng = np.random.default_rng(seed)
+    prices = 1.0 + 0.5 * np.sin(times.hour.to_numpy() / 24 * 2 * np.pi) + rng.normal(0, 0.05, len(times))
+    return pd.DataFrame({"DateTime": times, "SE3": prices})
+
+
+def test_complete_price_grid_averages_quarter_hours():
+    df_quarter = _month_prices(2025, 3, freq="15min")
+    df_grid = pg.complete_price_grid(df_quarter, 2025, 3)
+
+    assert len(df_grid) == 31 * 24 - 1  # sommartid 30 mars
+    expected = df_quarter.groupby(ci.local_to_utc_hour(df_quarter["DateTime"]))["SE3"].mean()
+    np.testing.assert_allclose(df_grid["SE3"], expected.to_numpy())
+    assert not df_grid["Provisional"].any()
+
+
+@pytest.mark.parametrize("strategy", pg.FILL_STRATEGIES)
+def test_fill_strategies(strategy):
+    history = _month_prices(2025, 2, seed=1)
+    df_full = _month_prices(2025, 3)
+    missing = df_full["DateTime"].dt.day.isin([10, 11]).to_numpy()
+    df = pg.complete_price_grid(df_full[~missing], 2025, 3)
+
+    df_filled = pg.fill_price_gaps(df, strategy=strategy, history=history)
+
+    assert not df_filled["SE3"].isna().any()
+    np.testing.assert_array_equal(df_filled["Provisional"], missing)
+    assert set(df_filled.loc[missing, "FillMethod"]) == {strategy}
+    assert set(df_filled.loc[~missing, "FillMethod"]) == {""}
+    np.testing.assert_array_equal(df_filled.loc[~missing, "SE3"], df.loc[~missing, "SE3"])
+    # Priserna följer dygnsprofilen ungefär (interpolate ger bara en rät linje över luckan)
+    error = np.abs(df_filled.loc[missing, "SE3"].to_numpy() - df_full.loc[missing, "SE3"].to_numpy())
+    assert error.mean() < (0.5 if strategy == "interpolate" else 0.2)
+
+
+def test_history_provisional_hours_are_ignored():
+    # Historik från två månader (upprepade index); preliminära timmar får inte användas som underlag
+    january, february = _month_prices(2025, 1, seed=2), _month_prices(2025, 2, seed=3)
+    january["Provisional"] = False
+    february["Provisional"] = february["DateTime"].dt.day >= 20
+    february.loc[february["Provisional"], "SE3"] = 1000.0
+    history = pd.concat([january, february])
+
+    df = pg.complete_price_grid(_month_prices(2025, 3).iloc[:0], 2025, 3)
+    df_filled = pg.fill_price_gaps(df, strategy="previous_day", history=history)
+    assert df_filled["SE3"].max() < 10
+
+
+def test_fetch_month_with_no_data_uses_history(monkeypatch):
+    def failing_get(url):
+        raise ConnectionError("offline")
+
+    monkeypatch.setattr(cc.requests, "get", failing_get)
+    history = _month_prices(2025, 2)
+
+    df = cc.fetch_monthly_prices_from_api(2025, 3, history=history)
+    assert len(df) == 31 * 24 - 1
+    assert df["Provisional"].all()
+    assert not df["SE3"].isna().any()
+
+    with pytest.raises(ValueError):
+        cc.fetch_monthly_prices_from_api(2025, 3)
+
+
+def test_merge_final_prices_and_recost():
+    df_final = _month_prices(2025, 3)
+    missing = df_final["DateTime"].dt.day == 12
+    df_prices = pg.fill_price_gaps(
+        pg.complete_price_grid(df_final[~missing], 2025, 3), history=_month_prices(2025, 2)
+    )
+
+    starts = pd.to_datetime(["2025-03-11 20:00", "2025-03-12 18:30", "2025-03-20 22:00"])
+    df_sessions = pd.DataFrame({
+        "Start": starts,
+        "End": starts + pd.Timedelta(hours=5),
+        "Consumption": [10.0, 12.0, 8.0],
+    })
+    df_result = cc.calculate_all_charging_costs(df_sessions, df_prices)
+    assert list(df_result["PriceStatus"]) == ["provisional", "provisional", "final"]
+
+    df_merged = pg.merge_final_prices(df_prices, df_final)
+    assert not df_merged["Provisional"].any()
+    np.testing.assert_allclose(df_merged["SE3"], df_final["SE3"].to_numpy())
+
+    df_recost = cc.recost_provisional_sessions(df_result, df_merged)
+    df_expected = cc.calculate_all_charging_costs(df_sessions, df_final)
+    assert list(df_recost["PriceStatus"]) == ["final"] * 3
+    np.testing.assert_allclose(df_recost["ChargingCost"], df_expected["ChargingCost"])
+    assert df_recost.loc[2, "ChargingCost"] == df_result.loc[2, "ChargingCost"]
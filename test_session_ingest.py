@@ -0,0 +1,78 @@
+import os
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+import session_ingest as si
+
+
+def _write_workbook(path, consumption, sheet_name="InputData"):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = sheet_name
+    ws.append(["Id", "Start", "End", "Consumption", "Comment"])
+    for i, kwh in enumerate(consumption):
+        start = pd.Timestamp("2025-03-01 18:00") + pd.Timedelta(days=i)
+        ws.append([i, start.to_pydatetime(), (start + pd.Timedelta(hours=3)).to_pydatetime(), kwh, "x"])
+    ws.append([None, None, None, None, None])
+    wb.save(path)
+
+
+@pytest.fixture
+def count_reads(monkeypatch):
+    calls = []
+    read = si.read_session_columns
+
+    def counting(file_path, sheet_name="InputData", *args):
+        calls.append(file_path)
+        return read(file_path, sheet_name, *args)
+
+    monkeypatch.setattr(si, "read_session_columns", counting)
+    return calls
+
+
+def test_read_session_columns(tmp_path):
+    path = str(tmp_path / "site.xlsx")
+    _write_workbook(path, [10.0, 12.5])
+    df = si.read_session_columns(path)
+    assert list(df.columns) == ["Start", "End", "Consumption"]
+    assert list(df["Consumption"]) == [10.0, 12.5]
+    assert df["Start"].iloc[1] == pd.Timestamp("2025-03-02 18:00")
+
+
+def test_cache_hit_and_miss_after_change(tmp_path, count_reads):
+    path = str(tmp_path / "site.xlsx")
+    cache_dir = str(tmp_path / "cache")
+    _write_workbook(path, [10.0, 12.5])
+
+    first = si.load_session_sheet_cached(path, cache_dir=cache_dir)
+    second = si.load_session_sheet_cached(path, cache_dir=cache_dir)
+    assert len(count_reads) == 1
+    pd.testing.assert_frame_equal(first, second)
+
+    # Ny mtime men samma innehåll: fortfarande en cacheträff
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    si.load_session_sheet_cached(path, cache_dir=cache_dir)
+    assert len(count_reads) == 1
+
+    # Ändrat innehåll: filen läses om
+    _write_workbook(path, [10.0, 12.5, 7.0])
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10**9))
+    third = si.load_session_sheet_cached(path, cache_dir=cache_dir)
+    assert len(count_reads) == 2
+    assert list(third["Consumption"]) == [10.0, 12.5, 7.0]
+
+
+def test_load_sessions_from_workbooks(tmp_path):
+    paths = [str(tmp_path / "a.xlsx"), str(tmp_path / "b.xlsx")]
+    _write_workbook(paths[0], [1.0, 2.0])
+    _write_workbook(paths[1], [3.0])
+    cache_dir = str(tmp_path / "cache")
+
+    serial = si.load_sessions_from_workbooks(paths, cache_dir=cache_dir, max_workers=1)
+    parallel = si.load_sessions_from_workbooks(paths, cache_dir=None, max_workers=2)
+    pd.testing.assert_frame_equal(serial, parallel)
+    assert list(serial["Site"]) == ["a", "a", "b"]
+    assert list(serial["Consumption"]) == [1.0, 2.0, 3.0]
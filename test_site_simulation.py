@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import calendar_index as ci
+import site_simulation as ss
+
+
+@pytest.fixture(scope="module")
+def price_df():
+    utc_hours = np.concatenate([ci.year_table(2024)["utc_hour"], ci.year_table(2025)["utc_hour"]])
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "DateTime": pd.DatetimeIndex(utc_hours * ci.HOUR_NS, tz="UTC").tz_convert(ci.TIMEZONE),
+        "SE3": rng.uniform(0.1, 2.0, len(utc_hours)),
+    })
+
+
+def test_same_seed_same_result_regardless_of_workers(price_df):
+    scenario = {"days": 60}
+    serial = ss.run_scenario(price_df, scenario, n_runs=12, seed=7, max_workers=1)
+    parallel = ss.run_scenario(price_df, scenario, n_runs=12, seed=7, max_workers=3)
+    pd.testing.assert_frame_equal(serial, parallel)
+
+    other = ss.run_scenario(price_df, scenario, n_runs=12, seed=8, max_workers=1)
+    assert not np.allclose(serial["Cost_SEK"], other["Cost_SEK"])
+
+
+def test_peak_is_concurrent_load():
+    start = np.full(10, int(17.5 * ci.HOUR_NS))
+    end = start + 2 * ci.HOUR_NS
+    assert ss.peak_concurrent_kw(start, end, 11.0) == 110.0
+
+    # En bil kopplas ur samtidigt som nästa kopplas in: ingen extra topp
+    assert ss.peak_concurrent_kw(np.array([0, 10]), np.array([10, 20]), 11.0) == 11.0
+    assert ss.peak_concurrent_kw(np.array([5]), np.array([5]), 11.0) == 0.0
+
+
+def test_summarize_runs(price_df):
+    df_runs = ss.run_scenario(price_df, {"days": 30}, n_runs=5, seed=1, max_workers=1)
+    assert (df_runs["Peak_kW"] >= df_runs["Peak_hour_kWh"] - 1e-9).all()
+    summary = ss.summarize_runs(df_runs)
+    assert list(summary.index) == ["mean", "p5", "p50", "p95"]
+    assert "Peak_hour_kWh" in summary